@@ -0,0 +1,56 @@
+# Запуск из backend/src:
+#   poetry install --with dev
+#   python -m benchmarks --save baseline.json
+#   python -m benchmarks --compare baseline.json
+# Нагрузочные сценарии требуют отдельную базу Postgres (DB_NAME с "bench" в имени),
+# httpx, fakeredis[lua] (или --redis real с REDIS_URL). Микробенчмаркам база не нужна.
+import sys
+import asyncio
+import argparse
+
+from . import harness, load, micro
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--levels", default="1,10,50", help="concurrency levels, comma separated")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and level")
+    parser.add_argument("--scenarios", default=",".join(load.SCENARIOS))
+    parser.add_argument("--redis", choices=("fake", "real"), default="fake")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--save", metavar="PATH", help="write results as a new baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail if results regress against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args()
+
+
+async def run_load(args) -> dict:
+    harness.check_database()
+    if args.redis == "fake":
+        harness.use_fake_redis()
+    levels = [int(level) for level in args.levels.split(",")]
+    async with harness.running_app() as client:
+        return await load.run(client, levels, args.requests, args.scenarios.split(","))
+
+
+def main():
+    args = parse_args()
+    results = {}
+    if not args.skip_load:
+        results["load"] = asyncio.run(run_load(args))
+    if not args.skip_micro:
+        results["micro"] = micro.run()
+    harness.print_table(results)
+    if args.save:
+        harness.save_baseline(results, args.save)
+    if args.compare:
+        regressions = harness.compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
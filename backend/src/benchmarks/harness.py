@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from statistics import quantiles
+
+# Настройки читаются при импорте settings.config, поэтому задаём их до импорта приложения.
+# Лимиты запросов подняты, иначе нагрузка упрётся в 429, а не в сервис
+BENCH_ENV = {
+    "SECRET_KEY": "benchmark-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "LOGIN_RATE_LIMIT_IP": "100000000",
+    "LOGIN_RATE_LIMIT_USERNAME": "100000000",
+    "CHANGE_PASSWORD_RATE_LIMIT": "100000000",
+    "AVAILABILITY_RATE_LIMIT": "100000000",
+    "QUERY_PROFILER": "false",
+}
+for _name, _value in BENCH_ENV.items():
+    os.environ.setdefault(_name, _value)
+
+
+def check_database():
+    # Бенчмарк создаёт и удаляет таблицы, поэтому работает только с отдельной базой
+    from settings.config import DB_NAME
+
+    name = DB_NAME or ""
+    if "bench" not in name:
+        raise SystemExit(f"DB_NAME={name!r}: load benchmarks need a throwaway database with 'bench' in its name")
+
+
+def use_fake_redis():
+    import fakeredis
+    import redis.asyncio as aioredis
+    from settings import database
+    from settings.config import REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT
+
+    # fakeredis[lua] нужен для скриптов лимитера и кодов смены пароля; пул такой же, как в init_redis_pool
+    database.redis_pool = aioredis.BlockingConnectionPool(
+        connection_class=fakeredis.aioredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        decode_responses=True,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+    )
+
+
+@asynccontextmanager
+async def running_app():
+    import httpx
+    from main import app
+    from settings.base_model import Base
+    from settings.database import engine
+    from core import models  # noqa: F401 - регистрирует таблицы в Base.metadata
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                yield client
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int) -> dict:
+    if len(latencies) > 1:
+        cuts = quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+    }
+
+
+async def run_level(operation, concurrency: int, total: int) -> dict:
+    # operation(worker) -> bool; каждый воркер выполняет операции последовательно
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker(index: int):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            ok = await operation(index)
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def save_baseline(results: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare(results: dict, path: str, tolerance: float) -> list[str]:
+    # Регрессия: p95 или время микробенчмарка выросли, либо пропускная способность упала больше допуска
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for scenario, levels in results.get("load", {}).items():
+        for level, current in levels.items():
+            base = baseline.get("load", {}).get(scenario, {}).get(level)
+            if base is None:
+                continue
+            if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{scenario} x{level}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(f"{scenario} x{level}: rps {base['rps']} -> {current['rps']}")
+    for name, current in results.get("micro", {}).items():
+        base = baseline.get("micro", {}).get(name)
+        if base is not None and current["us_per_op"] > base["us_per_op"] * (1 + tolerance):
+            regressions.append(f"{name}: {base['us_per_op']}us -> {current['us_per_op']}us")
+    return regressions
+
+
+def print_table(results: dict):
+    for scenario, levels in results.get("load", {}).items():
+        for level, row in levels.items():
+            print(f"{scenario:<16} x{level:<4} {row['rps']:>9} rps  p50 {row['p50_ms']:>8}ms  "
+                  f"p95 {row['p95_ms']:>8}ms  p99 {row['p99_ms']:>8}ms  errors {row['errors']}")
+    for name, row in results.get("micro", {}).items():
+        print(f"{name:<28} {row['us_per_op']:>12} us/op")
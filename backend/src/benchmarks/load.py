@@ -0,0 +1,94 @@
+import base64
+import random
+import itertools
+import httpx
+
+from .harness import run_level
+
+PASSWORDS = ("Bench-password-1", "Bench-password-2")
+SCENARIOS = ("signup", "login", "list_users", "get_user", "change_password")
+
+
+class Fixture:
+    # Сценарии - методы fixture(worker) -> bool, worker - номер конкурентного клиента
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.users: list[dict] = []
+        self._counter = itertools.count()
+
+    async def _create(self) -> httpx.Response:
+        username = f"bench_{next(self._counter)}"
+        return await self.client.post("/core/", data={
+            "username": username,
+            "email": f"{username}@bench-mail.com",
+            "password": PASSWORDS[0],
+        })
+
+    async def _login(self, user: dict) -> httpx.Response:
+        response = await self.client.post("/core/login", data={
+            "username": user["username"],
+            "password": user["password"],
+        })
+        if response.status_code == 200:
+            user["headers"] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def prepare(self, count: int):
+        # Активные пользователи с токенами, по одному на конкурентного клиента
+        for _ in range(count):
+            response = await self._create()
+            response.raise_for_status()
+            created = response.json()
+            uid = base64.urlsafe_b64encode(str(created["id"]).encode()).decode()
+            (await self.client.get(f"/core/{uid}/benchmark")).raise_for_status()
+            user = {"id": created["id"], "username": created["username"], "password": PASSWORDS[0]}
+            (await self._login(user)).raise_for_status()
+            self.users.append(user)
+
+    async def signup(self, worker: int) -> bool:
+        return (await self._create()).status_code == 200
+
+    async def login(self, worker: int) -> bool:
+        return (await self._login(self.users[worker % len(self.users)])).status_code == 200
+
+    async def list_users(self, worker: int) -> bool:
+        user = self.users[worker % len(self.users)]
+        return (await self.client.get("/core/", params={"limit": 50}, headers=user["headers"])).status_code == 200
+
+    async def get_user(self, worker: int) -> bool:
+        return (await self.client.get(f"/core/{random.choice(self.users)['id']}")).status_code == 200
+
+    async def change_password(self, worker: int) -> bool:
+        # Полный сценарий: вход, запрос кода, чтение кода из Redis вместо письма, подтверждение.
+        # Подтверждение отзывает токены, поэтому сценарий идёт последним
+        from core.password_codes import _code_key
+        from settings.database import get_redis
+
+        user = self.users[worker]
+        new_password = PASSWORDS[user["password"] == PASSWORDS[0]]
+        if (await self._login(user)).status_code != 200:
+            return False
+        response = await self.client.patch("/core/change_password", headers=user["headers"], data={
+            "password": user["password"],
+            "new_password": new_password,
+        })
+        if response.status_code != 200:
+            return False
+        code = await get_redis().hget(_code_key(user["id"]), "code")
+        response = await self.client.post("/core/verify_password", headers=user["headers"], data={"code": code})
+        if response.status_code != 200:
+            return False
+        user["password"] = new_password
+        return True
+
+
+async def run(client: httpx.AsyncClient, levels: list[int], total: int, scenarios=SCENARIOS) -> dict:
+    fixture = Fixture(client)
+    await fixture.prepare(max(levels))
+    results = {}
+    for name in SCENARIOS:
+        if name not in scenarios:
+            continue
+        operation = getattr(fixture, name)
+        results[name] = {str(level): await run_level(operation, level, total) for level in levels}
+    return results
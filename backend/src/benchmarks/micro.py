@@ -0,0 +1,43 @@
+import timeit
+from datetime import datetime, timedelta, timezone
+
+
+def measure(func, repeat: int = 5) -> dict:
+    # Лучший из повторов: меньше всего зависит от фонового шума
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+    return {"us_per_op": round(best * 1e6, 2)}
+
+
+def run() -> dict:
+    import jwt
+    from core.hashing import _hash, _verify
+    from core.models import User
+    from core.schemas import GetUserSchemas, UserPageSchema, user_adapter, users_adapter, user_page_adapter
+    from core.service import create_access_token
+    from core.tokens import decode_access_token
+    from settings.config import SECRET_KEY, ALGORITHM
+
+    hashed = _hash("Bench-password-1")
+    token = create_access_token({"sub": "1", "ver": 0}, timedelta(minutes=60))
+    rows = [User(id=i, username=f"bench_{i}", email=f"bench_{i}@bench-mail.com", is_active=True,
+                 hashed_password=hashed, token_version=0, created_at=datetime.now(timezone.utc))
+            for i in range(500)]
+    mappings = [{"id": row.id, "username": row.username, "email": row.email, "is_active": row.is_active}
+                for row in rows]
+    user = GetUserSchemas.model_validate(rows[0])
+    page = UserPageSchema(items=[GetUserSchemas.model_validate(row) for row in rows], next_cursor=500)
+
+    return {
+        "bcrypt_hash": measure(lambda: _hash("Bench-password-1"), repeat=3),
+        "bcrypt_verify": measure(lambda: _verify("Bench-password-1", hashed), repeat=3),
+        "jwt_encode": measure(lambda: create_access_token({"sub": "1", "ver": 0}, timedelta(minutes=60))),
+        "jwt_decode": measure(lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])),
+        "jwt_decode_cached": measure(lambda: decode_access_token(token)),
+        "user_from_orm": measure(lambda: GetUserSchemas.model_validate(rows[0])),
+        "user_dump_json": measure(lambda: user_adapter.dump_json(user)),
+        "page_500_from_orm": measure(lambda: [GetUserSchemas.model_validate(row) for row in rows]),
+        "page_500_from_rows": measure(lambda: users_adapter.validate_python(mappings)),
+        "page_500_dump_json": measure(lambda: user_page_adapter.dump_json(page)),
+    }
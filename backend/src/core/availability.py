@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import redis.asyncio as aioredis
+from sqlalchemy import select, exists, false
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis.exceptions import LockError, RedisError
+
+from settings.config import BLOOM_BITS, BLOOM_HASHES, BLOOM_SEED_CHUNK_SIZE
+from settings.database import async_session_maker
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+USERNAME_FILTER = "bloom:username"
+EMAIL_FILTER = "bloom:email"
+SEEDED_KEY = "bloom:seeded"
+
+
+def _positions(value: str) -> list[int]:
+    # Двойное хеширование: k позиций из двух 64-битных хешей
+    digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+async def _set_bits(redis: aioredis.Redis, usernames, emails):
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, values in ((USERNAME_FILTER, usernames), (EMAIL_FILTER, emails)):
+            for value in values:
+                for position in _positions(value):
+                    pipe.setbit(key, position, 1)
+        await pipe.execute()
+
+
+async def add_to_filters(redis: aioredis.Redis, usernames=(), emails=()):
+    try:
+        await _set_bits(redis, usernames, emails)
+    except RedisError:
+        logger.warning("Could not update availability filters", exc_info=True)
+
+
+async def _might_exist(redis: aioredis.Redis, username: str | None, email: str | None) -> tuple[bool, bool]:
+    # False означает «точно свободно», True — «возможно занято, нужно проверить в базе»
+    checks = [(USERNAME_FILTER, username), (EMAIL_FILTER, email)]
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.exists(SEEDED_KEY)
+            for key, value in checks:
+                for position in _positions(value) if value else ():
+                    pipe.getbit(key, position)
+            results = await pipe.execute()
+    except RedisError:
+        logger.warning("Availability filters are unavailable", exc_info=True)
+        return username is not None, email is not None
+    seeded, bits = results[0], results[1:]
+    if not seeded:
+        return username is not None, email is not None
+
+    answers = []
+    for _, value in checks:
+        if not value:
+            answers.append(False)
+            continue
+        answers.append(all(bits[:BLOOM_HASHES]))
+        bits = bits[BLOOM_HASHES:]
+    return answers[0], answers[1]
+
+
+async def check_taken(
+        db: AsyncSession,
+        redis: aioredis.Redis,
+        username: str | None = None,
+        email: str | None = None) -> tuple[bool, bool]:
+    # База проверяется только при срабатывании фильтра
+    username_maybe, email_maybe = await _might_exist(redis, username, email)
+    if not username_maybe and not email_maybe:
+        return False, False
+    query = select(
+        exists().where(User.username == username) if username_maybe else false(),
+        exists().where(User.email == email) if email_maybe else false(),
+    )
+    result = await db.execute(query)
+    username_taken, email_taken = result.one()
+    return bool(username_taken), bool(email_taken)
+
+
+async def seed_filters(redis: aioredis.Redis):
+    # Заполняет фильтры из таблицы users один раз; остальные воркеры пропускают seeding
+    try:
+        if await redis.exists(SEEDED_KEY):
+            return
+        async with redis.lock("bloom:seed_lock", timeout=600, blocking=False):
+            if await redis.exists(SEEDED_KEY):
+                return
+            async with async_session_maker() as db:
+                query = select(User.username, User.email).execution_options(yield_per=BLOOM_SEED_CHUNK_SIZE)
+                result = await db.stream(query)
+                async for rows in result.partitions():
+                    await _set_bits(redis, [row.username for row in rows], [row.email for row in rows])
+            await redis.set(SEEDED_KEY, 1)
+            logger.info("Availability filters seeded")
+    except LockError:
+        return
+    except Exception:
+        # Без флага seeded проверки продолжают подтверждаться базой
+        logger.exception("Could not seed availability filters")
@@ -0,0 +1,199 @@
+import time
+import asyncio
+import logging
+import redis.asyncio as aioredis
+from collections import OrderedDict
+from pydantic import ValidationError
+from redis.exceptions import RedisError
+
+from settings.config import (USER_CACHE_SIZE, USER_CACHE_TTL,
+                             USER_CACHE_REDIS_TTL, USER_CACHE_CHANNEL)
+
+from .schemas import CachedUserSchema
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_POLL_TIMEOUT = 1.0
+LISTENER_RETRY_MIN = 0.5
+LISTENER_RETRY_MAX = 30.0
+# Поколение пользователя растёт при каждой инвалидации и живёт дольше любого чтения из базы
+GENERATION_TTL = 24 * 3600
+
+# Запись в кэш, только если поколение не изменилось с момента чтения строки из базы
+SET_IF_GENERATION_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_users = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+_evict_callbacks = []
+_clear_callbacks = []
+
+
+def _user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def _generation_key(user_id: int) -> str:
+    return f"user:{user_id}:generation"
+
+
+async def get_cached_user(redis: aioredis.Redis, user_id: int) -> CachedUserSchema | None:
+    user = local_users.get(user_id)
+    if user is not None:
+        return user
+    try:
+        raw = await redis.get(_user_key(user_id))
+    except RedisError:
+        logger.warning("User cache is unavailable", exc_info=True)
+        return None
+    if raw is None:
+        return None
+    try:
+        user = CachedUserSchema.model_validate_json(raw)
+    except ValidationError:
+        # Запись в старом формате: читаем пользователя из базы заново
+        return None
+    local_users.set(user_id, user)
+    return user
+
+
+async def get_user_generation(redis: aioredis.Redis, user_id: int) -> int | None:
+    # Читается до запроса к базе; None - Redis недоступен, и результат кэшировать нельзя
+    try:
+        return int(await redis.get(_generation_key(user_id)) or 0)
+    except RedisError:
+        logger.warning("User cache is unavailable", exc_info=True)
+        return None
+
+
+async def set_cached_user(redis: aioredis.Redis, user: CachedUserSchema, generation: int | None):
+    # Если с момента чтения строки пользователь был инвалидирован, строка устарела и не кэшируется
+    if generation is None:
+        return
+    try:
+        script = redis.register_script(SET_IF_GENERATION_SCRIPT)
+        stored = await script(keys=[_user_key(user.id), _generation_key(user.id)],
+                              args=[generation, user.model_dump_json(), USER_CACHE_REDIS_TTL])
+    except RedisError:
+        logger.warning("User cache is unavailable", exc_info=True)
+        return
+    if stored:
+        local_users.set(user.id, user)
+
+
+def evict_local(user_id: int):
+    local_users.pop(user_id)
+    for callback in _evict_callbacks:
+        callback(user_id)
+
+
+def on_evict(callback):
+    # Другие локальные кэши по user_id сбрасываются вместе с кэшем пользователей
+    _evict_callbacks.append(callback)
+    return callback
+
+
+def clear_local():
+    local_users.clear()
+    for callback in _clear_callbacks:
+        callback()
+
+
+def on_clear(callback):
+    _clear_callbacks.append(callback)
+    return callback
+
+
+async def invalidate_user(redis: aioredis.Redis, *user_ids: int):
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            for user_id in user_ids:
+                pipe.incr(_generation_key(user_id))
+                pipe.expire(_generation_key(user_id), GENERATION_TTL)
+            pipe.delete(*(_user_key(user_id) for user_id in user_ids))
+            await pipe.execute()
+    except RedisError:
+        logger.warning("User cache is unavailable", exc_info=True)
+    # Локальный кэш сбрасывается после смены поколения: заполнения, начатые раньше, уже не запишутся
+    for user_id in user_ids:
+        evict_local(user_id)
+    try:
+        for user_id in user_ids:
+            await redis.publish(USER_CACHE_CHANNEL, user_id)
+    except RedisError:
+        logger.warning("User cache is unavailable", exc_info=True)
+
+
+async def _listen(redis: aioredis.Redis, on_subscribed):
+    # get_message с таймаутом вместо listen(): соединение из общего пула имеет socket_timeout,
+    # и блокирующее чтение без сообщений обрывалось бы через REDIS_SOCKET_TIMEOUT
+    pubsub = redis.pubsub()
+    try:
+        await pubsub.subscribe(USER_CACHE_CHANNEL)
+        on_subscribed()
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=PUBSUB_POLL_TIMEOUT)
+            if message is not None and message["type"] == "message":
+                evict_local(int(message["data"]))
+    finally:
+        await pubsub.aclose()
+
+
+async def listen_invalidations(redis: aioredis.Redis):
+    # Сбрасывает локальный кэш, когда пользователь изменился в другом воркере.
+    # После переподключения локальные кэши очищаются целиком: сообщения за время разрыва потеряны
+    delay = LISTENER_RETRY_MIN
+
+    def subscribed():
+        nonlocal delay
+        delay = LISTENER_RETRY_MIN
+        clear_local()
+
+    while True:
+        try:
+            await _listen(redis, subscribed)
+        except Exception:
+            logger.warning("Cache invalidation listener failed, reconnecting in %.1fs", delay, exc_info=True)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LISTENER_RETRY_MAX)
@@ -1,52 +1,97 @@
-import jwt
+import redis.asyncio as aioredis
 from jwt.exceptions import InvalidTokenError
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Annotated
-from passlib.context import CryptContext
 
-from .schemas import TokenData, UserSchemas
+from .schemas import CachedUserSchema
 from .models import User
-from settings.config import SECRET_KEY, ALGORITHM
-from settings.database import get_async_session
+from .cache import get_cached_user, get_user_generation, set_cached_user
+from .tokens import decode_access_token, is_token_revoked
+from .singleflight import single_flight
+from .lifecycle import spawn
+from settings.database import (get_async_session, get_async_redis, read_session,
+                               replica_engine, has_recent_write)
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/core/login")
 
 
+def credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer", "Location": "/login"},
+    )
+
+
+# Возвращённый объект общий для одновременных запросов, его можно только читать
+@single_flight(key=lambda db, username: username)
 async def get_user_by_username(db: AsyncSession, username: str):
     query = select(User).where(User.username == username)
     result = await db.execute(query)
     return result.scalars().first()
 
 
-async def get_current_user(
+async def get_current_user_id(
+    request: Request,
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: AsyncSession = Depends(get_async_session),
-):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer", "Location": "/login"},
-    )
+    redis: aioredis.Redis = Depends(get_async_redis),
+) -> int:
+    # Только проверка токена: без запросов к базе
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-
+        user_id, version = decode_access_token(token)
     except InvalidTokenError:
-        raise credentials_exception
-    user = await get_user_by_username(db, username=token_data.username)
+        raise credentials_exception()
+    if await is_token_revoked(redis, user_id, version):
+        raise credentials_exception()
+    request.state.user_id = user_id
+    request.state.token_version = version
+    return user_id
+
+
+async def get_current_user(
+    request: Request,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_async_redis),
+) -> CachedUserSchema:
+    user = await get_cached_user(redis, user_id)
     if user is None:
-        raise credentials_exception
+        # Поколение читается до запроса к базе: если пользователя инвалидируют в это время,
+        # прочитанная строка не попадёт в кэш
+        generation = await get_user_generation(redis, user_id)
+        # Сессия чтения открывается только при промахе кэша; сразу после своей записи -
+        # с primary, иначе отстающая реплика вернула бы в кэш старую строку
+        primary = replica_engine is None or await has_recent_write(redis, user_id)
+        async with read_session(primary) as read_db:
+            db_user = await read_db.get(User, user_id)
+        if db_user is None and read_db.bind is not db.bind:
+            # Реплика может отставать от primary
+            db_user = await db.get(User, user_id)
+        if db_user is None:
+            raise credentials_exception()
+        user = CachedUserSchema.model_validate(db_user)
+        spawn(set_cached_user(redis, user, generation))
+    # users.token_version - источник истины: токен отозван, даже если в Redis этого уже нет
+    if request.state.token_version < user.token_version:
+        raise credentials_exception()
     if not user.is_active:
         raise HTTPException(
             status_code=400,
             detail="Inactive user, please, verify your email")
     return user
+
+
+async def get_current_db_user(
+    user: CachedUserSchema = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session),
+) -> User:
+    # Для изменяющих запросов нужен ORM-объект, привязанный к сессии
+    db_user = await db.get(User, user.id)
+    if db_user is None:
+        raise credentials_exception()
+    return db_user
+
@@ -0,0 +1,95 @@
+import time
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from core.metrics import observe_hash
+from settings.config import HASH_EXECUTOR, HASH_WORKERS, HASH_QUEUE_SIZE, HASH_BULK_CHUNK_SIZE
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor: Executor | None = None
+_pending = 0
+
+
+# Выполняются в воркерах пула, поэтому должны быть функциями уровня модуля
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _hash_many(passwords: list[str]) -> list[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if HASH_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hashing")
+        else:
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+def queue_depth() -> int:
+    return _pending
+
+
+async def _run(func, *args):
+    global _pending
+    if _pending >= HASH_QUEUE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please, try again later",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), func, *args)
+    finally:
+        _pending -= 1
+        observe_hash(func.__name__.lstrip("_"), time.perf_counter() - started)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run(_verify, plain_password, hashed_password)
+
+
+async def hash_passwords(passwords: list[str], chunk_size: int = HASH_BULK_CHUNK_SIZE) -> list[str]:
+    # Пачки идут параллельно по числу воркеров, но оставляют место в очереди для логинов
+    semaphore = asyncio.Semaphore(max(1, min(HASH_WORKERS, HASH_QUEUE_SIZE // 2)))
+
+    async def hash_chunk(chunk: list[str]) -> list[str]:
+        async with semaphore:
+            return await _run(_hash_many, chunk)
+
+    chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+    results = await asyncio.gather(*(hash_chunk(chunk) for chunk in chunks))
+    return [hashed for chunk in results for hashed in chunk]
+
+
+async def warm_up():
+    # Запускает все процессы пула и прогревает bcrypt до первого логина.
+    # Идёт мимо _run: воркеров может быть больше HASH_QUEUE_SIZE, а очередь при старте пуста
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, _hash, "warm-up") for _ in range(HASH_WORKERS)))
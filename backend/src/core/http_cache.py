@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import redis.asyncio as aioredis
+from typing import Awaitable, Callable, NamedTuple
+from fastapi import Request, Response, status
+from redis.exceptions import RedisError
+
+from settings.config import RESPONSE_CACHE_TTL, READ_YOUR_WRITES_WINDOW
+from settings.database import replica_engine
+
+from .lifecycle import spawn
+
+logger = logging.getLogger(__name__)
+
+# Любая запись пользователя увеличивает поколение, ключи со старым поколением больше не читаются
+GENERATION_KEY = "resp:generation"
+# Новые пользователи получают id больше существующих и меняют только последнюю страницу списка,
+# поэтому регистрации увеличивают отдельное поколение, которое проверяют лишь такие ответы
+SIGNUP_GENERATION_KEY = "resp:signup_generation"
+# Пока реплика может отставать после записи, ответы, прочитанные с неё, не сохраняются
+RECENT_WRITE_KEY = "resp:recent_write"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    # Поколение регистраций, при котором собран ответ; None - ответ от регистраций не зависит
+    signup_generation: str | None = None
+
+
+class ResponseKey(NamedTuple):
+    key: str | None
+    recent_write: bool
+    signup_generation: str
+
+
+def make_cached_response(body: bytes, signup_generation: str | None = None) -> CachedResponse:
+    # Без Last-Modified: у него секундная точность, и запись в ту же секунду дала бы 304 на устаревший ответ
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    return CachedResponse(body, etag, signup_generation)
+
+
+async def response_key(redis: aioredis.Redis, name: str) -> ResponseKey:
+    # Ключ текущего поколения, признак недавней записи и поколение регистраций
+    try:
+        generation, recent_write, signup_generation = await redis.mget(
+            GENERATION_KEY, RECENT_WRITE_KEY, SIGNUP_GENERATION_KEY
+        )
+    except RedisError:
+        logger.warning("Response cache is unavailable", exc_info=True)
+        return ResponseKey(None, True, "0")
+    return ResponseKey(f"resp:{generation or 0}:{name}", recent_write is not None, signup_generation or "0")
+
+
+async def get_cached_response(redis: aioredis.Redis, key: str, signup_generation: str) -> CachedResponse | None:
+    try:
+        data = await redis.hgetall(key)
+    except RedisError:
+        logger.warning("Response cache is unavailable", exc_info=True)
+        return None
+    if not data:
+        return None
+    # Последняя страница, собранная до новых регистраций, устарела
+    if data.get("signup_generation", signup_generation) != signup_generation:
+        return None
+    return CachedResponse(data["body"].encode(), data["etag"], data.get("signup_generation"))
+
+
+async def store_response(redis: aioredis.Redis, key: str, cached: CachedResponse):
+    mapping = {"body": cached.body.decode(), "etag": cached.etag}
+    if cached.signup_generation is not None:
+        mapping["signup_generation"] = cached.signup_generation
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            # Перезапись устаревшей последней страницы не должна оставить её signup_generation
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, RESPONSE_CACHE_TTL)
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Response cache is unavailable", exc_info=True)
+
+
+async def invalidate_responses(redis: aioredis.Redis, signup: bool = False):
+    # signup=True - только добавление пользователей: сбрасываются лишь ответы, зависящие от регистраций
+    generation_key = SIGNUP_GENERATION_KEY if signup else GENERATION_KEY
+    try:
+        if replica_engine is None:
+            await redis.incr(generation_key)
+            return
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.incr(generation_key)
+            pipe.set(RECENT_WRITE_KEY, 1, px=int(READ_YOUR_WRITES_WINDOW * 1000))
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Could not invalidate response cache", exc_info=True)
+
+
+def is_not_modified(request: Request, cached: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or cached.etag in tags
+
+
+def to_response(request: Request, cached: CachedResponse) -> Response:
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, cached):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+
+async def cached_json_response(
+        request: Request,
+        redis: aioredis.Redis,
+        name: str,
+        build: Callable[[], Awaitable[tuple[bytes, bool]]],
+        from_replica: bool = False) -> Response:
+    # build возвращает тело и признак того, что новые регистрации меняют ответ.
+    # Поколения читаются до запроса к базе: если запись случится в это время,
+    # результат сохранится под устаревшим поколением и не будет прочитан
+    key, recent_write, signup_generation = await response_key(redis, name)
+    cached = await get_cached_response(redis, key, signup_generation) if key else None
+    if cached is None:
+        body, depends_on_signups = await build()
+        cached = make_cached_response(body, signup_generation if depends_on_signups else None)
+        # Ответ с отстающей реплики сразу после записи вернул бы в кэш старые данные
+        if key and not (from_replica and recent_write):
+            # Ответ не ждёт записи в Redis
+            spawn(store_response(redis, key, cached))
+    return to_response(request, cached)
@@ -0,0 +1,76 @@
+import asyncio
+import signal
+import logging
+from typing import Coroutine
+
+logger = logging.getLogger(__name__)
+
+_tasks: set[asyncio.Task] = set()
+ready = False
+draining = False
+
+
+def spawn(coro: Coroutine) -> asyncio.Task:
+    # Фоновые задачи хранятся здесь, чтобы их не собрал GC и их можно было дождаться при остановке
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def pending_tasks() -> int:
+    return len(_tasks)
+
+
+def mark_ready():
+    global ready, draining
+    ready, draining = True, False
+
+
+def mark_draining():
+    global ready, draining
+    ready, draining = False, True
+
+
+def install_sigterm_handler():
+    # Сначала перестаём считаться готовыми, затем передаём сигнал серверу (uvicorn)
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        return
+
+    def handler(signum, frame):
+        mark_draining()
+        previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, handler)
+
+
+async def drain(timeout: float):
+    mark_draining()
+    if not _tasks:
+        return
+    logger.info("Waiting for %s background tasks", len(_tasks))
+    _, pending = await asyncio.wait(set(_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning("Cancelled %s background tasks after %s seconds", len(pending), timeout)
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+class DrainMiddleware:
+    # Во время остановки новые запросы получают 503, keep-alive соединения закрываются
+    def __init__(self, app, exclude: tuple[str, ...] = ("/health",)):
+        self.app = app
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and draining and not scope["path"].startswith(self.exclude):
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"connection", b"close"), (b"retry-after", b"1"), (b"content-length", b"0")],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self.app(scope, receive, send)
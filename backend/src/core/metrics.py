@@ -0,0 +1,212 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable
+
+import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from settings.config import DEBUG
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # Для каждого набора меток: счётчики по корзинам (+Inf последней), сумма
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels):
+        counts, total = self._values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _format_labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{suffix} {total[0]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+http_requests = Counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+http_db_time = Histogram("http_request_db_seconds", "Time spent in Postgres per request", ("route",))
+http_db_queries = Histogram("http_request_db_queries", "SQL statements per request", ("route",),
+                            buckets=COUNT_BUCKETS)
+http_redis_time = Histogram("http_request_redis_seconds", "Time spent in Redis per request", ("route",))
+http_hash_time = Histogram("http_request_hash_seconds", "Time spent in bcrypt per request", ("route",))
+db_query_latency = Histogram("db_query_duration_seconds", "SQL statement latency")
+redis_command_latency = Histogram("redis_command_duration_seconds", "Redis command latency", ("command",))
+hash_latency = Histogram("password_hash_duration_seconds",
+                         "Password hashing latency, including the wait for a pool worker", ("operation",))
+
+REGISTRY = [http_requests, http_latency, http_db_time, http_db_queries, http_redis_time,
+            http_hash_time, db_query_latency, redis_command_latency, hash_latency]
+
+
+def register(metric: Counter | Histogram) -> Counter | Histogram:
+    REGISTRY.append(metric)
+    return metric
+
+
+class RequestTimings:
+    __slots__ = ("db_time", "db_queries", "redis_time", "hash_time")
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.redis_time = 0.0
+        self.hash_time = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return (f"app;dur={total * 1000:.1f}, db;dur={self.db_time * 1000:.1f};desc=\"{self.db_queries} queries\", "
+                f"redis;dur={self.redis_time * 1000:.1f}, hash;dur={self.hash_time * 1000:.1f}")
+
+
+# Задачи, запущенные из запроса (spawn), копируют контекст и дописывают время в тот же объект
+_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def observe_hash(operation: str, elapsed: float):
+    hash_latency.observe(elapsed, operation)
+    if (timings := _timings.get()) is not None:
+        timings.hash_time += elapsed
+
+
+def _observe_redis(command: str, elapsed: float):
+    redis_command_latency.observe(elapsed, command)
+    if (timings := _timings.get()) is not None:
+        timings.redis_time += elapsed
+
+
+def instrument_engine(engine: Engine):
+    # Async-движок вызывает эти события в greenlet с контекстом вызывающей корутины
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_query_latency.observe(elapsed)
+        if (timings := _timings.get()) is not None:
+            timings.db_time += elapsed
+            timings.db_queries += 1
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+
+class TimedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _observe_redis("PIPELINE", time.perf_counter() - started)
+
+
+class TimedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _observe_redis(str(args[0]).upper(), time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def route_name(scope) -> str:
+    # Шаблон пути, а не сам путь, чтобы /core/{user_id} не плодил метки
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, exclude: tuple[str, ...] = ("/metrics", "/health")):
+        self.app = app
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if DEBUG:
+                    header = timings.server_timing(time.perf_counter() - started)
+                    message["headers"] = [*message.get("headers", ()), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+            route = route_name(scope)
+            http_requests.inc(scope["method"], route, status_code)
+            http_latency.observe(time.perf_counter() - started, scope["method"], route)
+            http_db_time.observe(timings.db_time, route)
+            http_db_queries.observe(timings.db_queries, route)
+            http_redis_time.observe(timings.redis_time, route)
+            http_hash_time.observe(timings.hash_time, route)
+
+
+def render(gauges: dict[str, tuple[str, Callable[[], float]]]) -> str:
+    # Метрики процесса: при нескольких воркерах uvicorn каждый отдаёт свои значения
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    for name, (documentation, value) in gauges.items():
+        lines.extend((f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {value()}"))
+    return "\n".join(lines) + "\n"
@@ -1,7 +1,7 @@
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Boolean, DateTime, Integer, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Boolean, Date, DateTime, Integer, JSON, Text, Index, DDL, event, func
 from pydantic import EmailStr
-from datetime import datetime, timedelta
+from datetime import date, datetime
 
 from settings.base_model import Base
 
@@ -15,18 +15,44 @@ class User(Base):
 
     is_active: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
-
-    password_code: Mapped["PasswordCode"] = relationship("PasswordCode", back_populates="user")
-
-
-class PasswordCode(Base):
-    __tablename__ = 'password_codes'
-
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False, unique=True)
-    code: Mapped[int] = mapped_column(Integer, nullable=True)
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # Первое подтверждение email; после смены email is_active сбрасывается, а activated_at остаётся
+    activated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+# Индексы поиска из миграции c47a1e9b5d23. Классы операторов заданы через postgresql_ops,
+# а не текстом выражения: иначе autogenerate не сравнивает эти индексы.
+# lower() с text_pattern_ops: поиск по префиксу без учёта регистра
+Index("ix_users_username_lower", func.lower(User.username).label("username_lower"),
+      postgresql_ops={"username_lower": "text_pattern_ops"})
+Index("ix_users_email_lower", func.lower(User.email).label("email_lower"),
+      postgresql_ops={"email_lower": "text_pattern_ops"})
+# Триграммы для нечёткого поиска
+Index("ix_users_username_trgm", func.lower(User.username).label("username_lower"),
+      postgresql_using="gin", postgresql_ops={"username_lower": "gin_trgm_ops"})
+Index("ix_users_email_trgm", func.lower(User.email).label("email_lower"),
+      postgresql_using="gin", postgresql_ops={"email_lower": "gin_trgm_ops"})
+
+event.listen(User.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+class EmailOutbox(Base):
+    __tablename__ = 'email_outbox'
+
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default="pending", index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str] = mapped_column(Text, nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
 
-    user: Mapped["User"] = relationship("User", back_populates="password_code")
+class UserDailyStats(Base):
+    __tablename__ = 'user_daily_stats'
 
-    def is_code_valid(self) -> bool:
-        return datetime.now() - self.created_at <= timedelta(minutes=10)
+    # Сводка за день; свежие значения сначала копятся в Redis (core.stats)
+    day: Mapped[date] = mapped_column(Date, unique=True, nullable=False)
+    signups: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    activations: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
@@ -0,0 +1,37 @@
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import User, EmailOutbox
+from .schemas import GetUserSchemas
+
+
+ACTIVATE_ACCOUNT = "activate_account"
+CHANGE_PASSWORD = "change_password"
+
+
+def enqueue_email(db: AsyncSession, kind: str, **payload) -> EmailOutbox:
+    # Письмо сохраняется в той же транзакции, что и изменение пользователя
+    message = EmailOutbox(kind=kind, payload=payload)
+    db.add(message)
+    return message
+
+
+def enqueue_activation_email(db: AsyncSession, user: User | GetUserSchemas) -> EmailOutbox:
+    return enqueue_email(db, ACTIVATE_ACCOUNT, user_id=user.id, email=user.email, username=user.username)
+
+
+def enqueue_change_password_email(db: AsyncSession, code: int, user: User) -> EmailOutbox:
+    return enqueue_email(db, CHANGE_PASSWORD, code=code, email=user.email, username=user.username)
+
+
+async def enqueue_activation_emails(db: AsyncSession, users: list[dict]):
+    # Одна пачечная вставка вместо отдельного объекта на каждого пользователя
+    if not users:
+        return
+    await db.execute(insert(EmailOutbox), [
+        {
+            "kind": ACTIVATE_ACCOUNT,
+            "payload": {"user_id": user["id"], "email": user["email"], "username": user["username"]},
+        }
+        for user in users
+    ])
@@ -0,0 +1,51 @@
+import secrets
+import redis.asyncio as aioredis
+
+from settings.config import PASSWORD_CODE_TTL, PASSWORD_CODE_MAX_ATTEMPTS
+
+
+CODE_OK = "ok"
+CODE_INVALID = "invalid"
+CODE_EXPIRED = "expired"
+CODE_TOO_MANY_ATTEMPTS = "too_many_attempts"
+
+# Проверка кода и подсчёт попыток за один атомарный вызов.
+# При успехе ключ удаляется и возвращается новый хеш пароля
+VERIFY_CODE_SCRIPT = """
+local key = KEYS[1]
+if redis.call('EXISTS', key) == 0 then
+    return {'expired'}
+end
+local attempts = redis.call('HINCRBY', key, 'attempts', 1)
+if redis.call('HGET', key, 'code') == ARGV[1] then
+    local hashed_password = redis.call('HGET', key, 'hashed_password')
+    redis.call('DEL', key)
+    return {'ok', hashed_password}
+end
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', key)
+    return {'too_many_attempts'}
+end
+return {'invalid'}
+"""
+
+
+def _code_key(user_id: int) -> str:
+    return f"password_change:{user_id}"
+
+
+async def create_password_code(redis: aioredis.Redis, user_id: int, hashed_password: str) -> int:
+    code = secrets.randbelow(900000) + 100000
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(_code_key(user_id))
+        pipe.hset(_code_key(user_id), mapping={"code": code, "hashed_password": hashed_password, "attempts": 0})
+        pipe.expire(_code_key(user_id), PASSWORD_CODE_TTL)
+        await pipe.execute()
+    return code
+
+
+async def verify_password_code(redis: aioredis.Redis, user_id: int, code: int) -> tuple[str, str | None]:
+    script = redis.register_script(VERIFY_CODE_SCRIPT)
+    result = await script(keys=[_code_key(user_id)], args=[code, PASSWORD_CODE_MAX_ATTEMPTS])
+    status = result[0]
+    return status, result[1] if status == CODE_OK else None
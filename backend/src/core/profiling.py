@@ -0,0 +1,138 @@
+import time
+import random
+import logging
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core import lifecycle
+from core.metrics import Counter, register, route_name
+from settings.config import (SLOW_QUERY_THRESHOLD, SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+                             SLOW_QUERY_EXPLAIN_INTERVAL, REPEATED_QUERY_THRESHOLD)
+
+logger = logging.getLogger(__name__)
+
+slow_queries = register(Counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_THRESHOLD",
+                                ("route",)))
+repeated_queries = register(Counter("db_repeated_queries_total",
+                                    "Requests that ran the same SQL statement several times", ("route",)))
+
+# Форма запроса - текст SQL: SQLAlchemy передаёт значения отдельно от него
+_last_explained: dict[str, float] = {}
+_reported: set[tuple[str, str]] = set()
+
+
+class RequestProfile:
+    __slots__ = ("scope", "statements")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.statements: dict[str, int] = {}
+
+
+_profile: ContextVar[RequestProfile | None] = ContextVar("request_profile", default=None)
+
+
+def _current_route() -> str:
+    profile = _profile.get()
+    return route_name(profile.scope) if profile is not None else "background"
+
+
+def _should_explain(statement: str, executemany: bool) -> bool:
+    # EXPLAIN ANALYZE выполняет запрос, поэтому берём только чтения без блокировок
+    normalized = statement.lstrip().upper()
+    if executemany or not normalized.startswith("SELECT") or " FOR UPDATE" in normalized:
+        return False
+    now = time.monotonic()
+    if now - _last_explained.get(statement, float("-inf")) < SLOW_QUERY_EXPLAIN_INTERVAL:
+        return False
+    if random.random() >= SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+        return False
+    _last_explained[statement] = now
+    return True
+
+
+async def _explain(engine: AsyncEngine, statement: str, parameters, route: str, elapsed: float):
+    try:
+        async with engine.connect() as conn:
+            result = await conn.exec_driver_sql(
+                f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters,
+                execution_options={"query_profiler": False},
+            )
+            plan = "\n".join(row[0] for row in result)
+    except Exception:
+        logger.warning("Could not capture plan of slow query on %s: %s", route, statement, exc_info=True)
+        return
+    logger.warning("Slow query on %s took %.3fs: %s\n%s", route, elapsed, statement, plan)
+
+
+def _on_slow_query(engine: AsyncEngine, statement: str, parameters, executemany: bool, elapsed: float):
+    route = _current_route()
+    slow_queries.inc(route)
+    if _should_explain(statement, executemany):
+        # Событие синхронное, план снимаем отдельным соединением в фоне
+        lifecycle.spawn(_explain(engine, statement, parameters, route, elapsed))
+    else:
+        logger.warning("Slow query on %s took %.3fs: %s", route, elapsed, statement)
+
+
+def _profiled(context) -> bool:
+    return context is None or context.execution_options.get("query_profiler", True)
+
+
+def profile_engine(engine: AsyncEngine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _profiled(context):
+            conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not _profiled(context):
+            return
+        elapsed = time.perf_counter() - conn.info["profiler_started"].pop()
+        if (profile := _profile.get()) is not None:
+            profile.statements[statement] = profile.statements.get(statement, 0) + 1
+        if elapsed >= SLOW_QUERY_THRESHOLD:
+            _on_slow_query(engine, statement, parameters, executemany, elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        if (_profiled(context.execution_context) and context.connection is not None
+                and context.connection.info.get("profiler_started")):
+            context.connection.info["profiler_started"].pop()
+
+
+def _report_repeats(profile: RequestProfile):
+    repeated = {statement: count for statement, count in profile.statements.items()
+                if count >= REPEATED_QUERY_THRESHOLD}
+    if not repeated:
+        return
+    route = route_name(profile.scope)
+    repeated_queries.inc(route)
+    for statement, count in repeated.items():
+        # Каждую пару маршрут/запрос логируем один раз за процесс, дальше считает метрика
+        if (route, statement) in _reported:
+            continue
+        _reported.add((route, statement))
+        logger.warning("%s ran the same statement %s times in one request (possible N+1): %s",
+                       route, count, statement)
+
+
+class QueryProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile(scope)
+        token = _profile.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _profile.reset(token)
+            _report_repeats(profile)
@@ -1,55 +1,127 @@
-import asyncio
-from fastapi import APIRouter, Depends, Form
+import redis.asyncio as aioredis
+from fastapi import APIRouter, Depends, Form, Query, Request, UploadFile, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Annotated
+from datetime import date
 
-from settings.database import get_async_session, get_async_redis
+from settings.database import get_async_session, get_async_redis, get_read_session, is_replica
+from settings.config import USERS_PAGE_LIMIT, USERS_PAGE_MAX_LIMIT
 
 from . import service as service_core
+from .stats import get_user_stats
 from .models import User
-from .tasks import send_email_active_account
-from .dependencies import get_current_user
-from .schemas import (CreateUserSchemas, GetUserSchemas, Token,
-                      ChangeUsernameOrEmailSchema, ChangePasswordSchema)
+from .dependencies import get_current_user, get_current_user_id, get_current_db_user
+from .http_cache import cached_json_response
+from .throttling import throttle_login, change_password_limiter, availability_limiter
+from .schemas import (CreateUserSchemas, GetUserSchemas, UserPageSchema, Token, ImportResultSchema,
+                      ChangeUsernameOrEmailSchema, ChangePasswordSchema,
+                      UserBatchSchema, UserSearchPageSchema, UserStatsSchema, AvailabilitySchema,
+                      user_adapter, user_page_adapter, user_batch_adapter, user_search_adapter)
 
 router = APIRouter(
     tags=['core'],
     prefix='/core'
 )
 
-@router.get('/', response_model=List[GetUserSchemas], dependencies=[Depends(get_current_user)])
-async def get_user_route(db: AsyncSession = Depends(get_async_session)):
-    return await service_core.get_users(db)
+@router.get('/', response_model=UserPageSchema, dependencies=[Depends(get_current_user_id)])
+async def get_user_route(
+        request: Request,
+        limit: Annotated[int, Query(ge=1, le=USERS_PAGE_MAX_LIMIT)] = USERS_PAGE_LIMIT,
+        after: int | None = None,
+        stream: bool = False,
+        db: AsyncSession = Depends(get_read_session),
+        redis: aioredis.Redis = Depends(get_async_redis)
+):
+    if stream:
+        return StreamingResponse(service_core.stream_users(), media_type="application/x-ndjson")
+
+    async def build():
+        page = await service_core.get_users(db, limit, after)
+        # Новые пользователи попадают только на последнюю страницу
+        return user_page_adapter.dump_json(page), page.next_cursor is None
+    return await cached_json_response(request, redis, f"users:{limit}:{after}", build, is_replica(db))
+
+
+@router.get('/availability', response_model=AvailabilitySchema, dependencies=[Depends(availability_limiter)])
+async def availability_route(
+        username: str | None = None,
+        email: str | None = None,
+        db: AsyncSession = Depends(get_read_session),
+        redis: aioredis.Redis = Depends(get_async_redis)):
+    return await service_core.get_availability(db, redis, username, email)
+
+
+@router.get('/search', response_model=UserSearchPageSchema, dependencies=[Depends(get_current_user_id)])
+async def search_users_route(
+        q: Annotated[str, Query(min_length=1, max_length=100)],
+        limit: Annotated[int, Query(ge=1, le=USERS_PAGE_MAX_LIMIT)] = USERS_PAGE_LIMIT,
+        after: str | None = None,
+        db: AsyncSession = Depends(get_read_session)):
+    page = await service_core.search_users(db, q, limit, after)
+    return Response(user_search_adapter.dump_json(page), media_type="application/json")
+
+
+@router.get('/stats', response_model=UserStatsSchema, dependencies=[Depends(get_current_user_id)])
+async def user_stats_route(
+        date_from: date | None = None,
+        date_to: date | None = None,
+        db: AsyncSession = Depends(get_read_session),
+        redis: aioredis.Redis = Depends(get_async_redis)):
+    return await get_user_stats(db, redis, date_from, date_to)
+
+
+@router.get('/batch', response_model=UserBatchSchema)
+async def get_users_batch_route(
+        ids: Annotated[List[int], Query()],
+        db: AsyncSession = Depends(get_read_session)):
+    users = await service_core.get_users_batch(db, ids)
+    return Response(user_batch_adapter.dump_json(users), media_type="application/json")
 
 
 @router.get('/{user_id}', response_model=GetUserSchemas)
 async def get_user_by_id_route(
+        request: Request,
         user_id: int,
-        db: AsyncSession = Depends(get_async_session)):
-    return await service_core.get_user_by_id(db, user_id)
+        db: AsyncSession = Depends(get_read_session),
+        redis: aioredis.Redis = Depends(get_async_redis)):
+    async def build():
+        return user_adapter.dump_json(await service_core.get_user_by_id(db, user_id)), False
+    return await cached_json_response(request, redis, f"user:{user_id}", build, is_replica(db))
 
 
 @router.post('/', response_model=GetUserSchemas)
 async def create_user_route(
         user: Annotated[CreateUserSchemas, Form()],
-        db: AsyncSession = Depends(get_async_session)
+        db: AsyncSession = Depends(get_async_session),
+        redis: aioredis.Redis = Depends(get_async_redis)
+):
+    return await service_core.create_user(db, user, redis)
+
+
+@router.post('/import', response_model=ImportResultSchema, dependencies=[Depends(get_current_user_id)])
+async def import_users_route(
+        file: UploadFile,
+        db: AsyncSession = Depends(get_async_session),
+        redis: aioredis.Redis = Depends(get_async_redis)
 ):
-    user = await service_core.create_user(db, user)
-    asyncio.create_task(send_email_active_account(user.id, user.email, user.username))
-    return user
+    is_csv = file.content_type == "text/csv" or (file.filename or "").endswith(".csv")
+    content = await service_core.read_import_file(file)
+    return await service_core.import_users(db, redis, content, "csv" if is_csv else "ndjson")
 
 
 @router.get('/{uid}/{token}')
 async def verify_email_route(
         uid: str,
         token: str,
-        db: AsyncSession = Depends(get_async_session)
+        db: AsyncSession = Depends(get_async_session),
+        redis: aioredis.Redis = Depends(get_async_redis)
 ):
-    return await service_core.verify_email(uid, db)
+    return await service_core.verify_email(uid, db, redis)
 
 
-@router.post("/login")
+@router.post("/login", dependencies=[Depends(throttle_login)])
 async def login_for_access_token_route(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: AsyncSession = Depends(get_async_session),
@@ -61,27 +133,28 @@ async def login_for_access_token_route(
 async def pass_or_email_update_route(
         data: Annotated[ChangeUsernameOrEmailSchema, Form()],
         db: AsyncSession = Depends(get_async_session),
-        user: User = Depends(get_current_user)
+        redis: aioredis.Redis = Depends(get_async_redis),
+        user: GetUserSchemas = Depends(get_current_user)
 ):
-    return await service_core.change_username_email(data.username, data.email, user, db)
+    return await service_core.change_username_email(data.username, data.email, user, db, redis)
 
 
-@router.patch('/change_password', dependencies=[Depends(get_current_user)])
+@router.patch('/change_password', dependencies=[Depends(get_current_user), Depends(change_password_limiter)])
 async def change_password_route(
         data: Annotated[ChangePasswordSchema, Form()],
         db: AsyncSession = Depends(get_async_session),
-        redis: AsyncSession = Depends(get_async_redis),
-        user: User = Depends(get_current_user)
+        redis: aioredis.Redis = Depends(get_async_redis),
+        user: User = Depends(get_current_db_user)
 ):
     return await service_core.change_password(password=data.password, new_password=data.new_password, user=user, db=db, redis=redis)
 
 
-@router.post('/verify_password', dependencies=[Depends(get_current_user)], response_model=GetUserSchemas)
+@router.post('/verify_password', response_model=GetUserSchemas)
 async def verify_password_route(
         code: Annotated[int, Form()],
-        user: User = Depends(get_current_user),
+        user_id: int = Depends(get_current_user_id),
         db: AsyncSession = Depends(get_async_session),
-        redis: AsyncSession = Depends(get_async_redis)
+        redis: aioredis.Redis = Depends(get_async_redis)
 ):
-    return await service_core.verify_change_password(code, user, db, redis)
+    return await service_core.verify_change_password(code, user_id, db, redis)
 
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter
+from typing import Optional, List
+from typing_extensions import TypedDict
+from datetime import date
 
 
 class Token(BaseModel):
@@ -20,30 +22,104 @@ class UserSchemas(UserBase):
     is_active: bool = True
 
 
+# Длина колонок users.username и users.email (String(100)): длиннее в базу не записать
+USERNAME_MAX_LENGTH = 100
+EMAIL_MAX_LENGTH = 100
+
+
 class CreateUserSchemas(BaseModel):
-    username: str
-    email: EmailStr
+    username: str = Field(max_length=USERNAME_MAX_LENGTH)
+    email: EmailStr = Field(max_length=EMAIL_MAX_LENGTH)
     password: str
 
     class Config:
-        from_attribute = True
+        from_attributes = True
 
 
 class GetUserSchemas(BaseModel):
+    # Только для ответов: email уже проверен при записи, повторная проверка каждой строки из базы
+    # стоила бы дороже самой сериализации. EmailStr остаётся во входных схемах
     id: int
     username: str
-    email: EmailStr
+    email: str
     is_active: bool
 
     class Config:
-        from_attribute = True
+        from_attributes = True
+
+
+class UserRowSchema(TypedDict):
+    # Строка select(*USER_COLUMNS) для потоковой выгрузки: сериализуется как есть, без моделей и проверки
+    id: int
+    username: str
+    email: str
+    is_active: bool
+
+
+class CachedUserSchema(GetUserSchemas):
+    # Для кэша пользователей: версия токена нужна для проверки отзыва, в ответы не попадает
+    token_version: int
+
+
+class UserPageSchema(BaseModel):
+    items: List[GetUserSchemas]
+    next_cursor: int | None = None
+
+
+class UserSearchPageSchema(BaseModel):
+    items: List[GetUserSchemas]
+    next_cursor: str | None = None
+
+
+class UserBatchSchema(BaseModel):
+    items: List[GetUserSchemas]
+    missing: List[int]
+
+
+class AvailabilitySchema(BaseModel):
+    username: bool | None = None
+    email: bool | None = None
+
+
+class DailyUserStatsSchema(BaseModel):
+    day: date
+    signups: int
+    activations: int
+
+
+class UserStatsSchema(BaseModel):
+    date_from: date
+    date_to: date
+    signups: int
+    activations: int
+    activation_rate: float | None = None
+    days: List[DailyUserStatsSchema]
+
+
+# Адаптеры собираются один раз при импорте, а не на каждый запрос
+user_adapter = TypeAdapter(GetUserSchemas)
+users_adapter = TypeAdapter(List[GetUserSchemas])
+user_row_adapter = TypeAdapter(UserRowSchema)
+user_page_adapter = TypeAdapter(UserPageSchema)
+user_batch_adapter = TypeAdapter(UserBatchSchema)
+user_search_adapter = TypeAdapter(UserSearchPageSchema)
 
 
 class ChangeUsernameOrEmailSchema(BaseModel):
-    username: Optional[str] = None
-    email: Optional[EmailStr] = None
+    username: Optional[str] = Field(None, max_length=USERNAME_MAX_LENGTH)
+    email: Optional[EmailStr] = Field(None, max_length=EMAIL_MAX_LENGTH)
 
 
 class ChangePasswordSchema(BaseModel):
     password: str
     new_password: str
+
+
+class ImportErrorSchema(BaseModel):
+    row: int
+    detail: str
+
+
+class ImportResultSchema(BaseModel):
+    created: int
+    errors: List[ImportErrorSchema]
@@ -1,50 +1,181 @@
+import io
+import csv
 import jwt
-import asyncio
+import json
 import base64
-import random
-from fastapi import HTTPException, status
+import redis.asyncio as aioredis
+from itertools import islice
+from fastapi import HTTPException, UploadFile, status
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import select
+from sqlalchemy import (select, update, exists, any_, or_, and_, bindparam, case, cast, func, literal,
+                        Float, Integer, String)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from pydantic import EmailStr
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.orm import configure_mappers
+from pydantic import EmailStr, ValidationError
 
 from settings import config as _config
+from settings.database import async_session_maker, read_session, mark_recent_write, replica_engine, is_replica
+
+from .outbox import enqueue_activation_email, enqueue_activation_emails, enqueue_change_password_email
+from .schemas import (CreateUserSchemas, GetUserSchemas, UserPageSchema, UserSearchPageSchema, UserBatchSchema,
+                      Token, AvailabilitySchema, ImportErrorSchema, ImportResultSchema, user_adapter, users_adapter,
+                      user_row_adapter)
+from .dependencies import get_user_by_username
+from .hashing import hash_password, hash_passwords, verify_password
+from .cache import invalidate_user
+from .http_cache import invalidate_responses
+from .availability import check_taken, add_to_filters
+from .tokens import revoke_tokens
+from .singleflight import single_flight
+from .models import User
+from .stats import record_signups, record_activation
+from .password_codes import create_password_code, verify_password_code, CODE_OK, CODE_TOO_MANY_ATTEMPTS
+
+
+# Только колонки, нужные GetUserSchemas, без ORM-объектов и hashed_password
+USER_COLUMNS = (User.id, User.username, User.email, User.is_active)
+
+
+async def get_users(db: AsyncSession, limit: int, after: int | None = None):
+    query = select(*USER_COLUMNS).order_by(User.id).limit(limit + 1)
+    if after is not None:
+        query = query.where(User.id > after)
+    result = await db.execute(query)
+    users = result.mappings().all()
+
+    next_cursor = users[limit - 1]["id"] if len(users) > limit else None
+    return UserPageSchema(items=users_adapter.validate_python(users[:limit]), next_cursor=next_cursor)
 
-from .tasks import send_email_active_account, send_email_change_password
-from .schemas import CreateUserSchemas, Token
-from .dependencies import pwd_context, get_user_by_username
-from .models import User, PasswordCode
 
+def _parse_search_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        rank, user_id = cursor.split(":")
+        return float(rank), int(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def search_users(db: AsyncSession, q: str, limit: int, after: str | None = None):
+    term = q.strip().lower()
+    if not term:
+        raise HTTPException(status_code=400, detail="Search query is required")
+    username, email = func.lower(User.username), func.lower(User.email)
+    # Совпадения по префиксу идут первыми, остальные - по триграммному сходству (оператор % из pg_trgm);
+    # оба условия обслуживаются GIN-индексами ix_users_*_trgm
+    prefix = or_(username.startswith(term, autoescape=True), email.startswith(term, autoescape=True))
+    rank = case(
+        (prefix, literal(1.0, Float)),
+        else_=cast(func.greatest(func.similarity(username, term), func.similarity(email, term)), Float),
+    )
+    query = (select(*USER_COLUMNS, rank.label("rank"))
+             .where(or_(prefix, username.op("%")(term), email.op("%")(term)))
+             .order_by(rank.desc(), User.id)
+             .limit(limit + 1))
+    if after is not None:
+        after_rank, after_id = _parse_search_cursor(after)
+        query = query.where(or_(rank < after_rank, and_(rank == after_rank, User.id > after_id)))
+    result = await db.execute(query)
+    users = result.mappings().all()
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+    next_cursor = f"{users[limit - 1]['rank']!r}:{users[limit - 1]['id']}" if len(users) > limit else None
+    return UserSearchPageSchema(items=users_adapter.validate_python(users[:limit]), next_cursor=next_cursor)
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def stream_users(chunk_size: int = _config.USERS_STREAM_CHUNK_SIZE):
+    # Сессия открывается здесь: зависимость закрывается до начала отправки ответа
+    async with read_session() as db:
+        query = select(*USER_COLUMNS).order_by(User.id).execution_options(yield_per=chunk_size)
+        result = await db.stream(query)
+        async for users in result.mappings().partitions():
+            # Строки из базы уже в нужном виде: только сериализация, без проверки каждой строки
+            yield b"".join(user_row_adapter.dump_json(dict(user)) + b"\n" for user in users)
 
 
-async def get_users(db: AsyncSession):
-    users = select(User)
-    result = await db.execute(users)
-    users = result.scalars().all()
-    return users
+def _user_flight_key(db: AsyncSession, user_id: int) -> str | None:
+    # С настроенной репликой на primary читают только после своей записи (read-your-writes):
+    # такие чтения не присоединяются к чужим вызовам
+    if replica_engine is not None and not is_replica(db):
+        return None
+    return f"{'replica' if is_replica(db) else 'primary'}:{user_id}"
 
 
+# Через Redis делятся только результаты с реплики: их и так допускается читать с отставанием,
+# а записи не сбрасывают общий результат
+@single_flight(key=_user_flight_key, adapter=user_adapter, shared=lambda db, user_id: is_replica(db))
 async def get_user_by_id(db: AsyncSession, user_id: int):
-    user = select(User).where(User.id == user_id)
-    result = await db.execute(user)
-    user = result.scalars().first()
+    query = select(*USER_COLUMNS).where(User.id == user_id)
+    result = await db.execute(query)
+    user = result.mappings().first()
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return user
+    return user_adapter.validate_python(user)
+
+
+async def warm_up_queries():
+    # Компилирует частые запросы в кэш SQLAlchemy и подготавливает их в asyncpg до первого запроса
+    configure_mappers()
+    async with read_session() as db:
+        await get_users(db, 1)
+        await get_users_by_ids(db, [0])
+        await db.execute(select(*USER_COLUMNS).where(User.id == 0))
+    async with async_session_maker() as db:
+        await get_user_by_username(db, "")
+        await db.get(User, 0)
+
+
+async def get_users_by_ids(db: AsyncSession, user_ids: list[int]) -> dict[int, GetUserSchemas]:
+    # Один запрос WHERE id = ANY(:ids) с одним параметром-массивом
+    query = select(*USER_COLUMNS).where(User.id == any_(bindparam("ids", user_ids, type_=ARRAY(Integer))))
+    result = await db.execute(query)
+    return {user["id"]: user_adapter.validate_python(user) for user in result.mappings()}
+
+
+async def get_availability(
+        db: AsyncSession,
+        redis: aioredis.Redis,
+        username: str | None,
+        email: str | None) -> AvailabilitySchema:
+    if not username and not email:
+        raise HTTPException(status_code=400, detail="Username or email is required")
+    username_taken, email_taken = await check_taken(db, redis, username, email)
+    return AvailabilitySchema(
+        username=not username_taken if username else None,
+        email=not email_taken if email else None,
+    )
 
 
-async def create_user(db: AsyncSession, user: CreateUserSchemas):
-    hashed_password = get_password_hash(user.password)
+async def get_users_batch(db: AsyncSession, user_ids: list[int]) -> UserBatchSchema:
+    if len(user_ids) > _config.USERS_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids, max {_config.USERS_BATCH_MAX_IDS}")
+    user_ids = list(dict.fromkeys(user_ids))
+    users = await get_users_by_ids(db, user_ids)
+    return UserBatchSchema(
+        items=[users[user_id] for user_id in user_ids if user_id in users],
+        missing=[user_id for user_id in user_ids if user_id not in users],
+    )
+
+
+async def ensure_available(
+        db: AsyncSession,
+        redis: aioredis.Redis,
+        username: str | None = None,
+        email: str | None = None,
+        status_code: int = 400):
+    # Проверка до хеширования пароля и до транзакции; IntegrityError остаётся защитой от гонок
+    username_taken, email_taken = await check_taken(db, redis, username, email)
+    if username_taken:
+        raise HTTPException(status_code=status_code, detail="Username already exists")
+    if email_taken:
+        raise HTTPException(status_code=status_code, detail="Email already exists")
+
+
+async def create_user(db: AsyncSession, user: CreateUserSchemas, redis: aioredis.Redis):
+    await ensure_available(db, redis, user.username, user.email)
+    hashed_password = await hash_password(user.password)
 
     new_user = User(
         username=user.username,
@@ -54,17 +185,171 @@ async def create_user(db: AsyncSession, user: CreateUserSchemas):
 
     db.add(new_user)
     try:
+        await db.flush()
+        enqueue_activation_email(db, new_user)
         await db.commit()
         await db.refresh(new_user)
-        return new_user
     except IntegrityError as e:
         await db.rollback()
-        if "username" in str(e.orig):
-            raise HTTPException(status_code=400, detail="Username already exists")
-        elif "email" in str(e.orig):
-            raise HTTPException(status_code=400, detail="Email already exists")
-        else:
-            raise HTTPException(status_code=400, detail="Unique constraint failed")
+        raise unique_violation(e, status_code=400)
+    await add_to_filters(redis, [new_user.username], [new_user.email])
+    await invalidate_responses(redis, signup=True)
+    await record_signups(redis)
+    return new_user
+
+
+def unique_violation(e: IntegrityError, status_code: int = 409) -> HTTPException:
+    if "username" in str(e.orig):
+        return HTTPException(status_code=status_code, detail="Username already exists")
+    elif "email" in str(e.orig):
+        return HTTPException(status_code=status_code, detail="Email already exists")
+    else:
+        return HTTPException(status_code=status_code, detail="Unique constraint failed")
+
+
+async def update_user(
+        db: AsyncSession,
+        user_id: int,
+        bump_token_version: bool = False,
+        **values) -> tuple[GetUserSchemas, int]:
+    # Один UPDATE ... RETURNING вместо изменения ORM-объекта, commit и refresh.
+    # bump_token_version увеличивает версию токена, выданные ранее токены перестают действовать
+    if bump_token_version:
+        values["token_version"] = User.token_version + 1
+    query = (
+        update(User)
+        .where(User.id == user_id)
+        .values(**values)
+        .returning(*USER_COLUMNS, User.token_version)
+    )
+    try:
+        result = await db.execute(query)
+    except IntegrityError as e:
+        await db.rollback()
+        raise unique_violation(e)
+    user = result.mappings().first()
+    if not user:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="User not found")
+    return user_adapter.validate_python(user), user["token_version"]
+
+
+async def read_import_file(file: UploadFile) -> bytes:
+    # Загрузка сверх лимита не читается в память целиком
+    max_bytes = _config.IMPORT_MAX_BYTES
+    too_large = HTTPException(status_code=413, detail=f"File is too large, max {max_bytes} bytes")
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+    content = await file.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise too_large
+    return content
+
+
+def _jsonl_rows(text: str):
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+
+
+def parse_import_rows(content: bytes, file_format: str) -> list[dict | None]:
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    reader = csv.DictReader(io.StringIO(text)) if file_format == "csv" else _jsonl_rows(text)
+    # Разбор останавливается на первой строке сверх лимита
+    try:
+        rows = list(islice(reader, _config.IMPORT_MAX_ROWS + 1))
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"Malformed CSV: {e}")
+    if len(rows) > _config.IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Too many rows, max {_config.IMPORT_MAX_ROWS}")
+    return rows
+
+
+async def import_users(db: AsyncSession, redis: aioredis.Redis, content: bytes, file_format: str):
+    rows = parse_import_rows(content, file_format)
+
+    errors = []
+    valid: list[tuple[int, CreateUserSchemas]] = []
+    usernames, emails = set(), set()
+    for number, row in enumerate(rows, start=1):
+        if row is None:
+            errors.append(ImportErrorSchema(row=number, detail="Invalid JSON"))
+            continue
+        try:
+            user = CreateUserSchemas.model_validate(row)
+        except ValidationError as e:
+            errors.append(ImportErrorSchema(row=number, detail=str(e.errors()[0]["msg"])))
+            continue
+        if user.username in usernames or user.email in emails:
+            errors.append(ImportErrorSchema(row=number, detail="Duplicate username or email in file"))
+            continue
+        usernames.add(user.username)
+        emails.add(user.email)
+        valid.append((number, user))
+
+    # Уже существующие пользователи отсекаются одним запросом, их пароли не хешируются
+    if valid:
+        query = select(User.username, User.email).where(or_(
+            User.username == any_(bindparam("usernames", list(usernames), type_=ARRAY(String))),
+            User.email == any_(bindparam("emails", list(emails), type_=ARRAY(String))),
+        ))
+        existing = (await db.execute(query)).all()
+        existing_usernames = {row.username for row in existing}
+        existing_emails = {row.email for row in existing}
+        remaining = []
+        for number, user in valid:
+            if user.username in existing_usernames or user.email in existing_emails:
+                errors.append(ImportErrorSchema(row=number, detail="Username or email already exists"))
+            else:
+                remaining.append((number, user))
+        valid = remaining
+
+    hashed_passwords = await hash_passwords([user.password for _, user in valid])
+
+    created = []
+    now = datetime.now()
+    chunk_size = _config.IMPORT_INSERT_CHUNK_SIZE
+    for i in range(0, len(valid), chunk_size):
+        chunk = valid[i:i + chunk_size]
+        query = (
+            pg_insert(User)
+            .values([
+                {
+                    "username": user.username,
+                    "email": user.email,
+                    "hashed_password": hashed_password,
+                    "is_active": False,
+                    "created_at": now,
+                }
+                for (_, user), hashed_password in zip(chunk, hashed_passwords[i:i + chunk_size])
+            ])
+            .on_conflict_do_nothing()
+            .returning(User.id, User.username, User.email)
+        )
+        result = await db.execute(query)
+        inserted = {row.username: row for row in result}
+        for number, user in chunk:
+            if user.username in inserted:
+                created.append(inserted[user.username]._asdict())
+            else:
+                errors.append(ImportErrorSchema(row=number, detail="Username or email already exists"))
+
+    await enqueue_activation_emails(db, created)
+    await db.commit()
+    if created:
+        await add_to_filters(redis, [user["username"] for user in created], [user["email"] for user in created])
+        await invalidate_responses(redis, signup=True)
+        await record_signups(redis, len(created))
+
+    errors.sort(key=lambda error: error.row)
+    return ImportResultSchema(created=len(created), errors=errors)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -82,20 +367,40 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
 
-async def verify_email(uid: str, db: AsyncSession):
+async def verify_email(uid: str, db: AsyncSession, redis: aioredis.Redis):
     try:
         user_id = int(base64.urlsafe_b64decode(uid).decode())
     except:
         raise HTTPException(status_code=400, detail="Invalid uid")
-    user = await get_user_by_id(db, user_id)
-    if not user.is_active:
-        user.is_active = True
-        await db.commit()
+    # Активация только при переходе из неактивного состояния: повторный переход по ссылке ничего не меняет.
+    # Прежнее activated_at читается из заблокированной строки в том же UPDATE: повторное подтверждение
+    # после смены email не считается новой активацией
+    old = (select(User.id, User.activated_at)
+           .where(User.id == user_id, User.is_active.is_(False))
+           .with_for_update()
+           .subquery("old"))
+    result = await db.execute(
+        update(User)
+        .where(User.id == old.c.id)
+        .values(is_active=True, activated_at=func.coalesce(User.activated_at, func.now()))
+        .returning(User.id, old.c.activated_at.is_(None).label("first_activation"))
+    )
+    activated = result.one_or_none()
+    if activated is None:
+        if not await db.scalar(select(exists().where(User.id == user_id))):
+            raise HTTPException(status_code=404, detail="User not found")
+        return {"message": "Email verified"}
+    await db.commit()
+    await invalidate_user(redis, user_id)
+    await invalidate_responses(redis)
+    await mark_recent_write(redis, user_id)
+    if activated.first_activation:
+        await record_activation(redis)
     return {"message": "Email verified"}
 
 
@@ -116,7 +421,7 @@ async def login_for_access_token(form_data, db):
         )
     access_token_expires = timedelta(minutes=int(_config.ACCESS_TOKEN_EXPIRE_MINUTES))
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": str(user.id), "ver": user.token_version}, expires_delta=access_token_expires
     )
     return Token(access_token=access_token, token_type="bearer")
 
@@ -124,51 +429,37 @@ async def login_for_access_token(form_data, db):
 async def change_username_email(
         username: str | None,
         email: EmailStr | None,
-        user: User,
-        db: AsyncSession):
-    if username and email:
-        user.username = username
-        user.email = email
-        user.is_active = False
-        asyncio.create_task(send_email_active_account(user.id, email, username))
-        await db.commit()
-        await db.refresh(user)
-        return user
-    elif username:
-        user.username = username
-        await db.commit()
-        await db.refresh(user)
-        return user
-    elif email:
-        user.email = email
-        user.is_active = False
-        asyncio.create_task(send_email_active_account(user.id, email, user.username))
-        await db.commit()
-        await db.refresh(user)
+        user: GetUserSchemas,
+        db: AsyncSession,
+        redis: aioredis.Redis):
+    values = {}
+    if username:
+        values["username"] = username
+    if email:
+        values["email"] = email
+        values["is_active"] = False
+    if not values:
         return user
 
-
-async def get_password_code(
-        user: User,
-        repeat: bool,
-        db: AsyncSession):
-    query = select(PasswordCode).where(PasswordCode.user_id == user.id)
-    result = await db.execute(query)
-    code = result.scalars().first()
-
-    if not code:
-        code = PasswordCode(
-            user_id=user.id,
-            code=random.randint(100000, 999999))
-        db.add(code)
-        await db.commit()
-        await db.refresh(code)
-    elif repeat:
-        code.code = random.randint(100000, 999999)
-        await db.commit()
-        await db.refresh(code)
-
-    return code
+    # Проверяются только изменившиеся значения: свои текущие username/email заняты самим пользователем
+    await ensure_available(
+        db, redis,
+        username if username and username != user.username else None,
+        email if email and email != user.email else None,
+        status_code=409,
+    )
+    # Смена email снова требует подтверждения, поэтому старые токены отзываются
+    updated, token_version = await update_user(db, user.id, bump_token_version=bool(email), **values)
+    if email:
+        enqueue_activation_email(db, updated)
+    await db.commit()
+    if email:
+        await revoke_tokens(redis, user.id, token_version)
+    await add_to_filters(redis, [username] if username else [], [email] if email else [])
+    await invalidate_user(redis, user.id)
+    await invalidate_responses(redis)
+    await mark_recent_write(redis, user.id)
+    return updated
 
 
 async def change_password(
@@ -176,37 +467,36 @@ async def change_password(
         new_password: str,
         user: User,
         db: AsyncSession,
-        redis: AsyncSession
+        redis: aioredis.Redis
 ):
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Invalid password")
     if password == new_password:
         raise HTTPException(status_code=400, detail="New password cannot be the same as the old password")
-    hashed_password = get_password_hash(new_password)
-    code = await get_password_code(user, True, db)
+    hashed_password = await hash_password(new_password)
+    code = await create_password_code(redis, user.id, hashed_password)
 
-    asyncio.create_task(send_email_change_password(code.code, user.email, user.username))
-
-    await redis.setex(f"password:{user.id}", timedelta(minutes=10), hashed_password)
+    enqueue_change_password_email(db, code, user)
+    await db.commit()
 
     return {"message": "Code sent to email"}
 
 
 async def verify_change_password(
         code: int,
-        user: User,
+        user_id: int,
         db: AsyncSession,
-        redis: AsyncSession
+        redis: aioredis.Redis
 ):
-    code_user = await get_password_code(user, False, db)
-    if code_user.code == code:
-        password = await redis.get(f"password:{user.id}")
-        if not password:
-            raise HTTPException(status_code=400, detail="Invalid code")
-        user.hashed_password = password
-        await db.delete(code_user)
-        await db.commit()
-        await db.refresh(user)
-        return user
-
-    raise HTTPException(status_code=400, detail="Invalid code")
+    result, hashed_password = await verify_password_code(redis, user_id, code)
+    if result == CODE_TOO_MANY_ATTEMPTS:
+        raise HTTPException(status_code=400, detail="Too many attempts, please, request a new code")
+    if result != CODE_OK:
+        raise HTTPException(status_code=400, detail="Invalid code")
+
+    user, token_version = await update_user(db, user_id, bump_token_version=True, hashed_password=hashed_password)
+    await db.commit()
+    await revoke_tokens(redis, user.id, token_version)
+    await invalidate_user(redis, user.id)
+    await mark_recent_write(redis, user.id)
+    return user
@@ -0,0 +1,89 @@
+import asyncio
+import functools
+import logging
+from typing import Any, Callable, Hashable
+from pydantic import TypeAdapter
+from redis.exceptions import LockError, RedisError
+
+from settings.config import (SINGLE_FLIGHT_REDIS, SINGLE_FLIGHT_LOCK_TIMEOUT,
+                             SINGLE_FLIGHT_RESULT_TTL)
+from settings.database import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    # Не больше одного вызова на ключ в процессе, остальные ждут его результат.
+    # Результат общий для всех ожидающих, изменять его нельзя
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable, *args, **kwargs):
+        while (future := self._calls.get(key)) is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменили запрос-лидер, а не нас: выполняем вызов сами
+                if future.cancelled():
+                    continue
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+
+async def _do_shared(key: str, adapter: TypeAdapter, func: Callable, *args, **kwargs):
+    # Между воркерами: один берёт блокировку и кладёт результат в Redis на короткое время,
+    # остальные дожидаются блокировки и читают готовый результат
+    redis = get_redis()
+    result_key = f"singleflight:result:{key}"
+    try:
+        cached = await redis.get(result_key)
+        if cached is not None:
+            return adapter.validate_json(cached)
+        async with redis.lock(f"singleflight:lock:{key}", timeout=SINGLE_FLIGHT_LOCK_TIMEOUT,
+                              blocking_timeout=SINGLE_FLIGHT_LOCK_TIMEOUT):
+            cached = await redis.get(result_key)
+            if cached is not None:
+                return adapter.validate_json(cached)
+            result = await func(*args, **kwargs)
+            await redis.set(result_key, adapter.dump_json(result), px=int(SINGLE_FLIGHT_RESULT_TTL * 1000))
+            return result
+    except (LockError, RedisError):
+        logger.warning("Single-flight lock is unavailable", exc_info=True)
+        return await func(*args, **kwargs)
+
+
+def single_flight(key: Callable[..., Hashable | None], adapter: TypeAdapter | None = None,
+                  shared: Callable[..., bool] | None = None):
+    # key строит ключ из аргументов функции, None - вызвать без объединения;
+    # adapter нужен, чтобы делиться результатом через Redis, shared может запретить это для вызова
+    def decorator(func):
+        group = SingleFlight()
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> Any:
+            flight_key = key(*args, **kwargs)
+            if flight_key is None:
+                return await func(*args, **kwargs)
+            if SINGLE_FLIGHT_REDIS and adapter is not None and (shared is None or shared(*args, **kwargs)):
+                shared_key = f"{func.__module__}.{func.__qualname__}:{flight_key}"
+                return await group.do(flight_key, _do_shared, shared_key, adapter, func, *args, **kwargs)
+            return await group.do(flight_key, func, *args, **kwargs)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import logging
+import aiosmtplib
+from email.message import EmailMessage
+
+from settings.config import (EMAIL_USER, EMAIL_PASSWORD, EM_PORT, EM_HOST,
+                             SMTP_MAX_CONNECTIONS, SMTP_IDLE_TIMEOUT, SMTP_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    def __init__(self, max_connections: int = SMTP_MAX_CONNECTIONS, idle_timeout: float = SMTP_IDLE_TIMEOUT):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self._idle: list[tuple[aiosmtplib.SMTP, float]] = []
+        self._semaphore = asyncio.Semaphore(max_connections)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=EM_HOST,
+            port=EM_PORT,
+            start_tls=True,
+            username=EMAIL_USER,
+            password=EMAIL_PASSWORD,
+            timeout=SMTP_TIMEOUT,
+        )
+        await client.connect()
+        return client
+
+    @staticmethod
+    async def _close(client: aiosmtplib.SMTP):
+        try:
+            await client.quit()
+        except aiosmtplib.SMTPException:
+            client.close()
+
+    async def _acquire(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            client, released_at = self._idle.pop()
+            if client.is_connected and time.monotonic() - released_at < self.idle_timeout:
+                return client
+            await self._close(client)
+        return await self._connect()
+
+    def _release(self, client: aiosmtplib.SMTP):
+        if client.is_connected:
+            self._idle.append((client, time.monotonic()))
+
+    async def _send_message(self, client: aiosmtplib.SMTP, msg: EmailMessage) -> aiosmtplib.SMTP:
+        try:
+            await client.send_message(msg)
+        except aiosmtplib.SMTPServerDisconnected:
+            logger.info("SMTP connection lost, reconnecting")
+            client.close()
+            client = await self._connect()
+            await client.send_message(msg)
+        return client
+
+    async def send_many(self, messages: list[EmailMessage]) -> list[Exception | None]:
+        # Все письма уходят через одну авторизованную сессию,
+        # ошибка одного письма не прерывает отправку остальных
+        results = []
+        async with self._semaphore:
+            client = None
+            try:
+                for msg in messages:
+                    try:
+                        if client is None or not client.is_connected:
+                            client = await self._acquire()
+                        client = await self._send_message(client, msg)
+                        results.append(None)
+                    except (aiosmtplib.SMTPException, OSError) as e:
+                        results.append(e)
+            finally:
+                if client is not None:
+                    self._release(client)
+        return results
+
+    async def close(self):
+        while self._idle:
+            client, _ = self._idle.pop()
+            await self._close(client)
+
+
+smtp_pool = SMTPPool()
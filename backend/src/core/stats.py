@@ -0,0 +1,138 @@
+import logging
+import redis.asyncio as aioredis
+from datetime import date, timedelta
+from fastapi import HTTPException
+from redis.exceptions import RedisError, LockError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from settings.config import STATS_DEFAULT_DAYS, STATS_MAX_DAYS
+from settings.database import async_session_maker
+
+from .models import UserDailyStats
+from .schemas import DailyUserStatsSchema, UserStatsSchema
+
+logger = logging.getLogger(__name__)
+
+SIGNUPS = "signups"
+ACTIVATIONS = "activations"
+FIELDS = (SIGNUPS, ACTIVATIONS)
+# Дни, по которым в Redis есть ещё не перенесённые в user_daily_stats приращения
+PENDING_DAYS_KEY = "stats:users:pending"
+
+# Вычитает перенесённые в базу значения; приращения, сделанные во время переноса, остаются.
+# Пустой счётчик удаляется вместе с днём из списка ожидающих
+SUBTRACT_SCRIPT = """
+local remaining = 0
+for i, field in ipairs({'signups', 'activations'}) do
+    remaining = remaining + redis.call('HINCRBY', KEYS[1], field, -tonumber(ARGV[i]))
+end
+if remaining <= 0 then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[3])
+end
+return remaining
+"""
+
+
+def _day_key(day: str) -> str:
+    return f"stats:users:{day}"
+
+
+async def _record(redis: aioredis.Redis, field: str, count: int):
+    # Счётчики - наилучшее усилие: недоступный Redis не должен ломать регистрацию
+    day = date.today().isoformat()
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(_day_key(day), field, count)
+            pipe.sadd(PENDING_DAYS_KEY, day)
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Could not record user statistics", exc_info=True)
+
+
+async def record_signups(redis: aioredis.Redis, count: int = 1):
+    if count:
+        await _record(redis, SIGNUPS, count)
+
+
+async def record_activation(redis: aioredis.Redis):
+    await _record(redis, ACTIVATIONS, 1)
+
+
+async def _pending(redis: aioredis.Redis, days: list[str]) -> dict[str, dict[str, int]]:
+    async with redis.pipeline(transaction=False) as pipe:
+        for day in days:
+            pipe.hgetall(_day_key(day))
+        counters = await pipe.execute()
+    return {
+        day: {field: int(values.get(field, 0)) for field in FIELDS}
+        for day, values in zip(days, counters) if values
+    }
+
+
+async def compact(redis: aioredis.Redis) -> int:
+    # Переносит приращения из Redis в user_daily_stats; один воркер за раз
+    try:
+        async with redis.lock("stats:compact_lock", timeout=300, blocking=False):
+            pending = await _pending(redis, sorted(await redis.smembers(PENDING_DAYS_KEY)))
+            if not pending:
+                return 0
+            insert = pg_insert(UserDailyStats).values([
+                {"day": date.fromisoformat(day), **counts} for day, counts in pending.items()
+            ])
+            query = insert.on_conflict_do_update(
+                index_elements=[UserDailyStats.day],
+                set_={field: getattr(UserDailyStats, field) + getattr(insert.excluded, field) for field in FIELDS},
+            )
+            async with async_session_maker() as db:
+                await db.execute(query)
+                await db.commit()
+            # Падение между commit и вычитанием даст повторный перенос, а не потерю данных
+            subtract = redis.register_script(SUBTRACT_SCRIPT)
+            for day, counts in pending.items():
+                await subtract(keys=[_day_key(day), PENDING_DAYS_KEY],
+                               args=[counts[SIGNUPS], counts[ACTIVATIONS], day])
+            return len(pending)
+    except LockError:
+        return 0
+
+
+async def get_user_stats(
+        db: AsyncSession,
+        redis: aioredis.Redis,
+        date_from: date | None = None,
+        date_to: date | None = None) -> UserStatsSchema:
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=STATS_DEFAULT_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    if (date_to - date_from).days >= STATS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is too long, max {STATS_MAX_DAYS} days")
+
+    # Строки сводной таблицы за период плюс ещё не перенесённые счётчики из Redis
+    query = select(UserDailyStats.day, UserDailyStats.signups, UserDailyStats.activations).where(
+        UserDailyStats.day.between(date_from, date_to)
+    )
+    days = {row.day: {SIGNUPS: row.signups, ACTIVATIONS: row.activations} for row in await db.execute(query)}
+    try:
+        pending_days = [day for day in await redis.smembers(PENDING_DAYS_KEY)
+                        if date_from <= date.fromisoformat(day) <= date_to]
+        for day, counts in (await _pending(redis, pending_days)).items():
+            totals = days.setdefault(date.fromisoformat(day), {SIGNUPS: 0, ACTIVATIONS: 0})
+            for field in FIELDS:
+                totals[field] += counts[field]
+    except RedisError:
+        logger.warning("Real-time user statistics are unavailable", exc_info=True)
+
+    signups = sum(counts[SIGNUPS] for counts in days.values())
+    activations = sum(counts[ACTIVATIONS] for counts in days.values())
+    return UserStatsSchema(
+        date_from=date_from,
+        date_to=date_to,
+        signups=signups,
+        activations=activations,
+        activation_rate=round(activations / signups, 4) if signups else None,
+        days=[DailyUserStatsSchema(day=day, **counts) for day, counts in sorted(days.items())],
+    )
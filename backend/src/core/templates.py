@@ -0,0 +1,41 @@
+from pathlib import Path
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
+
+from settings.config import EMAIL_DEFAULT_LANGUAGE, EMAIL_TEMPLATES_CACHE_DIR
+
+from .outbox import ACTIVATE_ACCOUNT, CHANGE_PASSWORD
+
+
+TEMPLATES_DIR = Path(__file__).parent / "email_templates"
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(["html"]),
+    bytecode_cache=FileSystemBytecodeCache(EMAIL_TEMPLATES_CACHE_DIR),
+    auto_reload=False,
+)
+
+# kind -> язык -> (шаблон, тема письма)
+EMAIL_TEMPLATES = {
+    ACTIVATE_ACCOUNT: {
+        "ru": ("activate_account.ru.html", "Подтверждение аккаунта"),
+        "en": ("activate_account.en.html", "Account confirmation"),
+    },
+    CHANGE_PASSWORD: {
+        "ru": ("change_password.ru.html", "Подтверждение смены пароля"),
+        "en": ("change_password.en.html", "Password change confirmation"),
+    },
+}
+
+
+def load_templates():
+    # Компилируем все шаблоны заранее, дальше рендер берёт их из кэша окружения
+    for variants in EMAIL_TEMPLATES.values():
+        for template_name, _ in variants.values():
+            env.get_template(template_name)
+
+
+def render_email(kind: str, language: str | None = None, **context) -> tuple[str, str]:
+    variants = EMAIL_TEMPLATES[kind]
+    template_name, subject = variants.get(language or EMAIL_DEFAULT_LANGUAGE, variants[EMAIL_DEFAULT_LANGUAGE])
+    return subject, env.get_template(template_name).render(**context)
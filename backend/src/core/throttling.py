@@ -0,0 +1,88 @@
+import math
+import time
+import logging
+import redis.asyncio as aioredis
+from uuid import uuid4
+from typing import Annotated, Callable
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from redis.exceptions import RedisError
+
+from settings.config import (LOGIN_RATE_LIMIT_IP, LOGIN_RATE_LIMIT_USERNAME, LOGIN_RATE_WINDOW,
+                             CHANGE_PASSWORD_RATE_LIMIT, CHANGE_PASSWORD_RATE_WINDOW,
+                             AVAILABILITY_RATE_LIMIT, AVAILABILITY_RATE_WINDOW)
+from settings.database import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Скользящее окно на sorted set: возвращает 0, если запрос разрешён,
+# иначе сколько миллисекунд ждать до освобождения слота
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+if redis.call('ZCARD', key) >= limit then
+    local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+    return math.max(tonumber(oldest[2]) + window - now, 1)
+end
+redis.call('ZADD', key, now, ARGV[4])
+redis.call('PEXPIRE', key, window)
+return 0
+"""
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def current_user_id(request: Request) -> str:
+    # Для маршрутов с авторизацией: get_current_user_id должен стоять в зависимостях раньше лимитера
+    return str(request.state.user_id)
+
+
+class RateLimiter:
+    def __init__(self, scope: str, limit: int, window: float, key_func: Callable[[Request], str] = client_ip):
+        self.scope = scope
+        self.limit = limit
+        self.window_ms = int(window * 1000)
+        self.key_func = key_func
+
+    async def hit(self, redis: aioredis.Redis, identity: str):
+        now = int(time.time() * 1000)
+        script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+        try:
+            retry_after_ms = await script(
+                keys=[f"ratelimit:{self.scope}:{identity}"],
+                args=[now, self.window_ms, self.limit, f"{now}:{uuid4().hex}"],
+            )
+        except RedisError:
+            # Лимитер не должен ронять запросы, если Redis недоступен
+            logger.warning("Rate limiter is unavailable", exc_info=True)
+            return
+        if retry_after_ms:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please, try again later",
+                headers={"Retry-After": str(math.ceil(int(retry_after_ms) / 1000))},
+            )
+
+    async def __call__(self, request: Request, redis: aioredis.Redis = Depends(get_async_redis)):
+        await self.hit(redis, self.key_func(request))
+
+
+login_ip_limiter = RateLimiter("login:ip", LOGIN_RATE_LIMIT_IP, LOGIN_RATE_WINDOW)
+login_username_limiter = RateLimiter("login:username", LOGIN_RATE_LIMIT_USERNAME, LOGIN_RATE_WINDOW)
+change_password_limiter = RateLimiter("change_password", CHANGE_PASSWORD_RATE_LIMIT, CHANGE_PASSWORD_RATE_WINDOW,
+                                      key_func=current_user_id)
+availability_limiter = RateLimiter("availability", AVAILABILITY_RATE_LIMIT, AVAILABILITY_RATE_WINDOW)
+
+
+async def throttle_login(
+        request: Request,
+        form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+        redis: aioredis.Redis = Depends(get_async_redis),
+):
+    await login_ip_limiter.hit(redis, client_ip(request))
+    await login_username_limiter.hit(redis, form_data.username.lower())
@@ -0,0 +1,87 @@
+import jwt
+import time
+import logging
+import redis.asyncio as aioredis
+from jwt.exceptions import InvalidTokenError
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from settings.config import (SECRET_KEY, ALGORITHM, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL,
+                             USER_CACHE_SIZE, USER_CACHE_TTL)
+from settings.database import async_session_maker
+
+from .cache import TTLCache, on_evict, on_clear
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# user_id -> минимальная действующая версия токена; копия users.token_version,
+# пропавшие из Redis значения читаются заново из базы
+REVOCATION_KEY = "token_versions"
+
+local_tokens = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+local_versions = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+on_evict(local_versions.pop)
+on_clear(local_versions.clear)
+
+
+def decode_access_token(token: str) -> tuple[int, int]:
+    # Проверенные токены кэшируются, повторные запросы не вызывают jwt.decode
+    claims = local_tokens.get(token)
+    if claims is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        try:
+            claims = (int(payload["sub"]), int(payload.get("ver", 0)), payload["exp"])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidTokenError("Malformed token claims")
+        local_tokens.set(token, claims)
+    user_id, version, expires_at = claims
+    if expires_at <= time.time():
+        local_tokens.pop(token)
+        raise InvalidTokenError("Token has expired")
+    return user_id, version
+
+
+async def _load_token_version(user_id: int) -> int:
+    # Всегда с primary: отстающая реплика вернула бы версию до отзыва
+    async with async_session_maker() as db:
+        version = await db.scalar(select(User.token_version).where(User.id == user_id))
+    return version or 0
+
+
+async def get_min_token_version(redis: aioredis.Redis, user_id: int) -> int:
+    version = local_versions.get(user_id)
+    if version is not None:
+        return version
+    try:
+        stored = await redis.hget(REVOCATION_KEY, user_id)
+    except RedisError:
+        # Без Redis отзыв проверяется по базе, а не пропускается
+        logger.warning("Token revocation list is unavailable", exc_info=True)
+        version = await _load_token_version(user_id)
+    else:
+        if stored is not None:
+            version = int(stored)
+        else:
+            version = await _load_token_version(user_id)
+            try:
+                # NX: не затираем версию, записанную revoke_tokens после нашего чтения
+                await redis.hsetnx(REVOCATION_KEY, user_id, version)
+            except RedisError:
+                logger.warning("Token revocation list is unavailable", exc_info=True)
+    local_versions.set(user_id, version)
+    return version
+
+
+async def is_token_revoked(redis: aioredis.Redis, user_id: int, version: int) -> bool:
+    return version < await get_min_token_version(redis, user_id)
+
+
+async def revoke_tokens(redis: aioredis.Redis, user_id: int, token_version: int):
+    # Токены с версией ниже token_version больше не принимаются;
+    # другие воркеры узнают об этом через invalidate_user
+    local_versions.set(user_id, token_version)
+    try:
+        await redis.hset(REVOCATION_KEY, user_id, token_version)
+    except RedisError:
+        logger.error("Could not revoke tokens of user %s", user_id, exc_info=True)
@@ -0,0 +1,141 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+
+from settings.config import (OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_ATTEMPTS,
+                             OUTBOX_BACKOFF_BASE, OUTBOX_BACKOFF_MAX, OUTBOX_RETENTION_DAYS,
+                             SMTP_MAX_CONNECTIONS, STATS_COMPACT_INTERVAL)
+from settings.database import async_session_maker, engine, get_redis, close_redis_pool
+
+from .models import EmailOutbox
+from .outbox import ACTIVATE_ACCOUNT, CHANGE_PASSWORD
+from .smtp import smtp_pool
+from .stats import compact as compact_stats
+from .tasks import build_email_active_account, build_email_change_password
+from .templates import load_templates
+
+logger = logging.getLogger(__name__)
+
+BUILDERS = {
+    ACTIVATE_ACCOUNT: build_email_active_account,
+    CHANGE_PASSWORD: build_email_change_password,
+}
+
+
+def backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX))
+
+
+def drop_code(message: EmailOutbox):
+    # Код смены пароля живёт в Redis PASSWORD_CODE_TTL секунд, в базе после отправки он не нужен.
+    # Новый словарь вместо изменения на месте: иначе JSON-колонка не попадёт в UPDATE
+    if "code" in message.payload:
+        message.payload = {key: value for key, value in message.payload.items() if key != "code"}
+
+
+def mark_failed(message: EmailOutbox, error: Exception):
+    message.attempts += 1
+    message.last_error = repr(error)
+    if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+        message.status = "failed"
+        drop_code(message)
+        logger.error("Email %s failed after %s attempts", message.id, message.attempts)
+    else:
+        message.next_attempt_at = datetime.now() + backoff(message.attempts)
+
+
+def mark_sent(message: EmailOutbox):
+    message.status = "sent"
+    message.sent_at = datetime.now()
+    drop_code(message)
+
+
+async def deliver(messages: list[EmailOutbox]):
+    prepared = []
+    for message in messages:
+        try:
+            prepared.append((message, BUILDERS[message.kind](**message.payload)))
+        except Exception as e:
+            mark_failed(message, e)
+    if not prepared:
+        return
+
+    # Пачка делится между соединениями пула, каждое отправляет свою часть в одной сессии
+    chunks = [prepared[i::SMTP_MAX_CONNECTIONS] for i in range(min(SMTP_MAX_CONNECTIONS, len(prepared)))]
+    results = await asyncio.gather(
+        *(smtp_pool.send_many([msg for _, msg in chunk]) for chunk in chunks)
+    )
+    for chunk, errors in zip(chunks, results):
+        for (message, _), error in zip(chunk, errors):
+            if error is None:
+                mark_sent(message)
+            else:
+                mark_failed(message, error)
+
+
+async def process_batch(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    # SKIP LOCKED позволяет запускать несколько воркеров без двойной отправки
+    async with async_session_maker() as db:
+        query = (
+            select(EmailOutbox)
+            .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= datetime.now())
+            .order_by(EmailOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(query)
+        messages = result.scalars().all()
+        await deliver(messages)
+        await db.commit()
+        return len(messages)
+
+
+async def purge_outbox(retention: timedelta = timedelta(days=OUTBOX_RETENTION_DAYS)) -> int:
+    # Обработанные письма старше срока хранения удаляются, чтобы email_outbox не рос бесконечно
+    async with async_session_maker() as db:
+        result = await db.execute(
+            delete(EmailOutbox).where(
+                EmailOutbox.status.in_(("sent", "failed")),
+                EmailOutbox.created_at < datetime.now() - retention,
+            )
+        )
+        await db.commit()
+        return result.rowcount
+
+
+async def run_worker():
+    load_templates()
+    logger.info("Email outbox worker started")
+    next_compaction = time.monotonic()
+    try:
+        while True:
+            try:
+                processed = await process_batch()
+            except Exception:
+                logger.exception("Email outbox batch failed")
+                processed = 0
+            # Тот же воркер периодически переносит счётчики статистики из Redis в user_daily_stats
+            # и удаляет старые обработанные письма
+            if time.monotonic() >= next_compaction:
+                next_compaction = time.monotonic() + STATS_COMPACT_INTERVAL
+                try:
+                    await compact_stats(get_redis())
+                except Exception:
+                    logger.exception("User statistics compaction failed")
+                try:
+                    await purge_outbox()
+                except Exception:
+                    logger.exception("Email outbox cleanup failed")
+            if processed < OUTBOX_BATCH_SIZE:
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+    finally:
+        await smtp_pool.close()
+        await close_redis_pool()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker())
@@ -1,13 +1,87 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
+from core import lifecycle, metrics
+from core.profiling import QueryProfilerMiddleware
 from core.router import router as core_router
+from core.hashing import (get_executor, shutdown_executor, queue_depth as hash_queue_depth,
+                          warm_up as warm_up_hashing)
+from core.cache import listen_invalidations
+from core.service import warm_up_queries
+from core.availability import seed_filters
+from settings.config import SHUTDOWN_DRAIN_TIMEOUT, QUERY_PROFILER
+from settings.database import (init_redis_pool, close_redis_pool, get_redis,
+                               warm_up_engines, dispose_engines,
+                               get_engine_pool_stats, get_redis_pool_stats)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_executor()
+    init_redis_pool()
+    await get_redis().ping()
+    await warm_up_engines()
+    await warm_up_hashing()
+    await warm_up_queries()
+    listener = asyncio.create_task(listen_invalidations(get_redis()))
+    lifecycle.install_sigterm_handler()
+    lifecycle.mark_ready()
+    # Пока фильтры не заполнены, проверки подтверждаются базой
+    lifecycle.spawn(seed_filters(get_redis()))
+    yield
+    await lifecycle.drain(SHUTDOWN_DRAIN_TIMEOUT)
+    listener.cancel()
+    # Ошибка слушателя не должна мешать закрыть пулы и executor
+    await asyncio.gather(listener, return_exceptions=True)
+    await close_redis_pool()
+    await dispose_engines()
+    shutdown_executor()
+
 
 app = FastAPI(
     title='Iiko_fastapi',
     description='API for iiko_fastapi',
     version='1.0.0',
-    swagger_ui_oauth2_redirect_url="/docs/oauth2-redirect"
+    swagger_ui_oauth2_redirect_url="/docs/oauth2-redirect",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
+app.add_middleware(lifecycle.DrainMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+if QUERY_PROFILER:
+    app.add_middleware(QueryProfilerMiddleware)
+
+
+@app.get('/health/live', include_in_schema=False)
+async def live_route():
+    return {"status": "ok"}
+
+
+@app.get('/health/ready', include_in_schema=False)
+async def ready_route():
+    if not lifecycle.ready:
+        return ORJSONResponse({"status": "draining" if lifecycle.draining else "starting"},
+                              status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready", "background_tasks": lifecycle.pending_tasks()}
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics_route():
+    engine_pool = get_engine_pool_stats()
+    redis_pool = get_redis_pool_stats()
+    gauges = {
+        "background_tasks": ("Tracked background tasks (cache fills, response cache writes)",
+                             lifecycle.pending_tasks),
+        "password_hash_queue_depth": ("Password hashing jobs queued or running", hash_queue_depth),
+        "db_pool_checked_out": ("Postgres connections in use", lambda: engine_pool.get("checked_out", 0)),
+        "db_pool_checked_in": ("Idle Postgres connections in the pool", lambda: engine_pool.get("checked_in", 0)),
+        "db_pool_overflow": ("Postgres connections above pool_size", lambda: engine_pool.get("overflow", 0)),
+        "redis_pool_in_use": ("Redis connections in use", lambda: redis_pool["in_use"]),
+        "redis_pool_available": ("Idle Redis connections in the pool", lambda: redis_pool["available"]),
+    }
+    return PlainTextResponse(metrics.render(gauges), media_type=metrics.CONTENT_TYPE)
 
 
 app.include_router(core_router)
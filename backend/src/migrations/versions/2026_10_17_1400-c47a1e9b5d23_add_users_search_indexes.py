@@ -0,0 +1,42 @@
+"""add users search indexes
+
+Revision ID: c47a1e9b5d23
+Revises: 8b2e4d1f6a90
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47a1e9b5d23'
+down_revision: Union[str, None] = '8b2e4d1f6a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY не блокирует запись в users, но не может выполняться в транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username) text_pattern_ops')],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email) text_pattern_ops')],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_users_username_trgm', 'users', [sa.text('lower(username) gin_trgm_ops')],
+                        postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_users_email_trgm', 'users', [sa.text('lower(email) gin_trgm_ops')],
+                        postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_email_trgm', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_username_trgm', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_email_lower', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_username_lower', table_name='users', postgresql_concurrently=True, if_exists=True)
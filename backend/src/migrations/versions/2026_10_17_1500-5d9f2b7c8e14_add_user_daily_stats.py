@@ -0,0 +1,43 @@
+"""add user_daily_stats
+
+Revision ID: 5d9f2b7c8e14
+Revises: c47a1e9b5d23
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d9f2b7c8e14'
+down_revision: Union[str, None] = 'c47a1e9b5d23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_daily_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('signups', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('activations', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day'),
+    )
+    # Один раз заполняем историю из users. Даты активации не хранятся,
+    # поэтому для прошлых дней активации считаются по дню регистрации
+    op.execute(
+        "INSERT INTO user_daily_stats (day, signups, activations) "
+        "SELECT created_at::date, count(*), count(*) FILTER (WHERE is_active) "
+        "FROM users GROUP BY created_at::date"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_daily_stats')
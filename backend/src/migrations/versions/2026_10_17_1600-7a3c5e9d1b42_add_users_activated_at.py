@@ -0,0 +1,31 @@
+"""add users.activated_at
+
+Revision ID: 7a3c5e9d1b42
+Revises: 5d9f2b7c8e14
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3c5e9d1b42'
+down_revision: Union[str, None] = '5d9f2b7c8e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('activated_at', sa.DateTime(), nullable=True))
+    # Уже активные пользователи учтены в user_daily_stats; дата активации неизвестна,
+    # как и в 5d9f2b7c8e14 берём дату регистрации
+    op.execute("UPDATE users SET activated_at = created_at WHERE is_active")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'activated_at')
@@ -19,7 +19,123 @@ EMAIL_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
 EM_PORT = os.environ.get("EMAIL_PORT")
 EM_HOST = os.environ.get("EMAIL_HOST")
 
+# Отладка: заголовок Server-Timing в ответах
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+
 # jwt auth
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
+
+# Password hashing
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "process")  # process | thread
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", 64))
+HASH_BULK_CHUNK_SIZE = int(os.getenv("HASH_BULK_CHUNK_SIZE", 16))
+
+# Authenticated user cache
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+USER_CACHE_REDIS_TTL = int(os.getenv("USER_CACHE_REDIS_TTL", 300))
+USER_CACHE_CHANNEL = os.getenv("USER_CACHE_CHANNEL", "user_cache:invalidate")
+
+# Redis connection pool
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+# Сколько секунд ждать свободное соединение, когда заняты все REDIS_MAX_CONNECTIONS
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 2))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+
+# SQLAlchemy engine pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", 0))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+# PgBouncer в transaction mode: без пула на стороне приложения и без prepared statements
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# Users listing
+USERS_PAGE_LIMIT = int(os.getenv("USERS_PAGE_LIMIT", 50))
+USERS_PAGE_MAX_LIMIT = int(os.getenv("USERS_PAGE_MAX_LIMIT", 500))
+USERS_STREAM_CHUNK_SIZE = int(os.getenv("USERS_STREAM_CHUNK_SIZE", 1000))
+USERS_BATCH_MAX_IDS = int(os.getenv("USERS_BATCH_MAX_IDS", 200))
+
+# Email outbox worker
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 5))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 3600))
+# Сколько хранятся отправленные и окончательно неотправленные письма
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", 7))
+
+# SMTP connection pool
+SMTP_MAX_CONNECTIONS = int(os.getenv("SMTP_MAX_CONNECTIONS", 3))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", 60))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+
+# Email templates
+EMAIL_DEFAULT_LANGUAGE = os.getenv("EMAIL_DEFAULT_LANGUAGE", "ru")
+EMAIL_TEMPLATES_CACHE_DIR = os.getenv("EMAIL_TEMPLATES_CACHE_DIR")
+
+# Rate limits (количество запросов за окно в секундах)
+LOGIN_RATE_LIMIT_IP = int(os.getenv("LOGIN_RATE_LIMIT_IP", 20))
+LOGIN_RATE_LIMIT_USERNAME = int(os.getenv("LOGIN_RATE_LIMIT_USERNAME", 5))
+LOGIN_RATE_WINDOW = float(os.getenv("LOGIN_RATE_WINDOW", 60))
+CHANGE_PASSWORD_RATE_LIMIT = int(os.getenv("CHANGE_PASSWORD_RATE_LIMIT", 5))
+CHANGE_PASSWORD_RATE_WINDOW = float(os.getenv("CHANGE_PASSWORD_RATE_WINDOW", 300))
+AVAILABILITY_RATE_LIMIT = int(os.getenv("AVAILABILITY_RATE_LIMIT", 30))
+AVAILABILITY_RATE_WINDOW = float(os.getenv("AVAILABILITY_RATE_WINDOW", 60))
+
+# Bulk user import
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 10000))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", 5 * 1024 * 1024))
+IMPORT_INSERT_CHUNK_SIZE = int(os.getenv("IMPORT_INSERT_CHUNK_SIZE", 1000))
+
+# Password change codes
+PASSWORD_CODE_TTL = int(os.getenv("PASSWORD_CODE_TTL", 600))
+PASSWORD_CODE_MAX_ATTEMPTS = int(os.getenv("PASSWORD_CODE_MAX_ATTEMPTS", 5))
+
+# Read replica (необязательная)
+DB_REPLICA_HOST = os.environ.get("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.environ.get("DB_REPLICA_PORT", DB_PORT)
+DB_REPLICA_RETRY_INTERVAL = float(os.getenv("DB_REPLICA_RETRY_INTERVAL", 30))
+# Короткий таймаут подключения: недоступная реплика не должна держать запрос 60 секунд по умолчанию asyncpg
+DB_REPLICA_CONNECT_TIMEOUT = float(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", 2))
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", 5))
+
+# Access token cache
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", 300))
+
+# Single-flight
+SINGLE_FLIGHT_REDIS = os.getenv("SINGLE_FLIGHT_REDIS", "false").lower() == "true"
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", 5))
+SINGLE_FLIGHT_RESULT_TTL = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", 0.5))
+
+# HTTP response cache
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 300))
+
+# Lifespan
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 10))
+
+# Username/email availability Bloom filter
+BLOOM_BITS = int(os.getenv("BLOOM_BITS", 2 ** 24))
+BLOOM_HASHES = int(os.getenv("BLOOM_HASHES", 7))
+BLOOM_SEED_CHUNK_SIZE = int(os.getenv("BLOOM_SEED_CHUNK_SIZE", 5000))
+
+# Query profiler: медленные запросы и повторяющиеся (N+1) запросы
+QUERY_PROFILER = os.getenv("QUERY_PROFILER", "true").lower() == "true"
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", 0.5))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.1))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+REPEATED_QUERY_THRESHOLD = int(os.getenv("REPEATED_QUERY_THRESHOLD", 2))
+
+# Signup/activation statistics
+STATS_COMPACT_INTERVAL = float(os.getenv("STATS_COMPACT_INTERVAL", 300))
+STATS_DEFAULT_DAYS = int(os.getenv("STATS_DEFAULT_DAYS", 30))
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", 366))
@@ -1,13 +1,118 @@
+import time
+import logging
 import redis.asyncio as aioredis
+from contextlib import AsyncExitStack, asynccontextmanager
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from uuid import uuid4
+from fastapi import Depends, Request
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from .config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, REDIS_URL
+from sqlalchemy.pool import NullPool
+from core.metrics import TimedRedis, instrument_engine
+from core.profiling import profile_engine
+from .config import (DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, REDIS_URL,
+                     DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+                     DB_POOL_PRE_PING, DB_POOL_WARMUP, DB_STATEMENT_CACHE_SIZE, DB_PGBOUNCER,
+                     REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT, REDIS_SOCKET_TIMEOUT,
+                     REDIS_CONNECT_TIMEOUT, REDIS_HEALTH_CHECK_INTERVAL,
+                     DB_REPLICA_HOST, DB_REPLICA_PORT, DB_REPLICA_RETRY_INTERVAL, DB_REPLICA_CONNECT_TIMEOUT,
+                     READ_YOUR_WRITES_WINDOW, QUERY_PROFILER)
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+REPLICA_DATABASE_URL = (
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}"
+    if DB_REPLICA_HOST else None
+)
+
+
+def _engine_options(connect_timeout: float | None = None) -> dict:
+    if DB_PGBOUNCER:
+        options = {
+            "poolclass": NullPool,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            },
+        }
+    else:
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "connect_args": {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+        }
+    if connect_timeout is not None:
+        options["connect_args"]["timeout"] = connect_timeout
+    return options
 
-engine = create_async_engine(DATABASE_URL)
+
+engine = create_async_engine(DATABASE_URL, **_engine_options())
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+instrument_engine(engine.sync_engine)
+if QUERY_PROFILER:
+    profile_engine(engine)
+
+replica_engine = (
+    create_async_engine(REPLICA_DATABASE_URL, **_engine_options(DB_REPLICA_CONNECT_TIMEOUT))
+    if REPLICA_DATABASE_URL else None
+)
+replica_session_maker = (
+    sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine else None
+)
+if replica_engine is not None:
+    instrument_engine(replica_engine.sync_engine)
+    if QUERY_PROFILER:
+        profile_engine(replica_engine)
+_replica_down_until = 0.0
+
+redis_pool: aioredis.ConnectionPool | None = None
+
+
+async def warm_up_engine(connections: int = DB_POOL_WARMUP, target: AsyncEngine = engine):
+    # Открываем соединения одновременно, чтобы они остались в пуле
+    if DB_PGBOUNCER or connections <= 0:
+        return
+    async with AsyncExitStack() as stack:
+        for _ in range(min(connections, DB_POOL_SIZE)):
+            conn = await stack.enter_async_context(target.connect())
+            await conn.execute(text("SELECT 1"))
+
+
+async def warm_up_engines():
+    await warm_up_engine()
+    if replica_engine is not None:
+        try:
+            await warm_up_engine(target=replica_engine)
+        except (DBAPIError, OSError):
+            logger.warning("Could not warm up read replica", exc_info=True)
+
+
+async def dispose_engines():
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+
+def get_engine_pool_stats() -> dict:
+    pool = engine.pool
+    if DB_PGBOUNCER:
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
@@ -15,9 +120,103 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
-async def get_async_redis() -> AsyncGenerator[aioredis.Redis, None]:
-    redis = await aioredis.from_url(REDIS_URL, decode_responses=True)
+async def _replica_connected(session: AsyncSession) -> bool:
+    global _replica_down_until
     try:
-        yield redis
-    finally:
-        await redis.close()
+        await session.connection()
+        return True
+    except (DBAPIError, OSError):
+        # OSError включает TimeoutError по DB_REPLICA_CONNECT_TIMEOUT.
+        # Не пробуем реплику снова до истечения интервала, чтобы не ждать таймаут на каждом запросе
+        logger.warning("Read replica is unavailable, falling back to primary", exc_info=True)
+        _replica_down_until = time.monotonic() + DB_REPLICA_RETRY_INTERVAL
+        return False
+
+
+@asynccontextmanager
+async def read_session(primary: bool = False) -> AsyncGenerator[AsyncSession, None]:
+    if not primary and replica_session_maker is not None and time.monotonic() >= _replica_down_until:
+        async with replica_session_maker() as session:
+            if await _replica_connected(session):
+                yield session
+                return
+    async with async_session_maker() as session:
+        yield session
+
+
+def is_replica(session: AsyncSession) -> bool:
+    return replica_engine is not None and session.bind is replica_engine
+
+
+def _recent_write_key(user_id: int) -> str:
+    return f"recent_write:{user_id}"
+
+
+async def mark_recent_write(redis: aioredis.Redis, user_id: int):
+    if replica_engine is None:
+        return
+    try:
+        await redis.set(_recent_write_key(user_id), 1, px=int(READ_YOUR_WRITES_WINDOW * 1000))
+    except RedisError:
+        logger.warning("Could not mark recent write", exc_info=True)
+
+
+async def has_recent_write(redis: aioredis.Redis, user_id: int) -> bool:
+    try:
+        return bool(await redis.exists(_recent_write_key(user_id)))
+    except RedisError:
+        return True
+
+
+def init_redis_pool() -> aioredis.ConnectionPool:
+    global redis_pool
+    if redis_pool is None:
+        # Блокирующий пул: при всплеске запрос ждёт свободное соединение до REDIS_POOL_TIMEOUT,
+        # а не получает сразу ConnectionError. Слушатель инвалидаций держит одно соединение постоянно
+        redis_pool = aioredis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        )
+    return redis_pool
+
+
+async def close_redis_pool():
+    global redis_pool
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+        redis_pool = None
+
+
+def get_redis() -> aioredis.Redis:
+    return TimedRedis(connection_pool=init_redis_pool())
+
+
+def get_redis_pool_stats() -> dict:
+    if redis_pool is None:
+        return {"max_connections": REDIS_MAX_CONNECTIONS, "in_use": 0, "available": 0}
+    return {
+        "max_connections": redis_pool.max_connections,
+        "in_use": len(redis_pool._in_use_connections),
+        "available": len(redis_pool._available_connections),
+    }
+
+
+async def get_async_redis() -> AsyncGenerator[aioredis.Redis, None]:
+    # Клиент берёт соединения из общего пула, закрывать его не нужно
+    yield get_redis()
+
+
+async def get_read_session(
+        request: Request,
+        redis: aioredis.Redis = Depends(get_async_redis),
+) -> AsyncGenerator[AsyncSession, None]:
+    # user_id кладёт get_current_user; после своей записи пользователь читает с primary
+    user_id = getattr(request.state, "user_id", None)
+    primary = replica_engine is None or (user_id is not None and await has_recent_write(redis, user_id))
+    async with read_session(primary) as session:
+        yield session
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+# Настройки читаются при импорте settings.config, поэтому задаём их до импорта приложения
+TEST_ENV = {
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "test",
+    "DB_USER": "test",
+    "DB_PASS": "test",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "SECRET_KEY": "test-secret-key-of-at-least-32-bytes",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "5",
+}
+for _name, _value in TEST_ENV.items():
+    os.environ.setdefault(_name, _value)
+
+
+@pytest.fixture
+async def redis():
+    # fakeredis[lua] исполняет Lua-скрипты лимитера, кодов смены пароля и статистики
+    import fakeredis
+
+    client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    yield client
+    await client.aclose()
@@ -0,0 +1,76 @@
+import pytest
+
+from core.cache import (TTLCache, _user_key, clear_local, get_cached_user, get_user_generation, invalidate_user,
+                        local_users, set_cached_user)
+from core.schemas import CachedUserSchema
+
+
+def test_get_returns_stored_value():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("missing") is None
+
+
+def test_expired_entry_is_dropped(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("core.cache.time.monotonic", lambda: now)
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+
+    now += 11
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_pop_and_clear():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.get("a") is None
+    cache.clear()
+    assert len(cache) == 0
+
+
+@pytest.fixture
+def user():
+    clear_local()
+    yield CachedUserSchema(id=1, username="alice", email="alice@example.com", is_active=False, token_version=0)
+    clear_local()
+
+
+async def test_fill_is_stored_without_invalidation(redis, user):
+    generation = await get_user_generation(redis, user.id)
+    await set_cached_user(redis, user, generation)
+
+    assert local_users.get(user.id) == user
+    assert await redis.exists(_user_key(user.id))
+
+
+async def test_fill_is_dropped_after_concurrent_invalidation(redis, user):
+    # Строка прочитана до коммита verify_email, инвалидация прошла до записи в кэш
+    generation = await get_user_generation(redis, user.id)
+    await invalidate_user(redis, user.id)
+    await set_cached_user(redis, user, generation)
+
+    assert local_users.get(user.id) is None
+    assert await get_cached_user(redis, user.id) is None
+
+
+async def test_fill_is_skipped_without_generation(redis, user):
+    await set_cached_user(redis, user, None)
+    assert await get_cached_user(redis, user.id) is None
@@ -0,0 +1,18 @@
+import asyncio
+
+from settings import database
+
+
+def test_replica_engine_gets_connect_timeout():
+    assert database._engine_options(1.5)["connect_args"]["timeout"] == 1.5
+    assert "timeout" not in database._engine_options()["connect_args"]
+
+
+async def test_replica_timeout_falls_back_to_primary(monkeypatch):
+    class Session:
+        async def connection(self):
+            raise asyncio.TimeoutError()
+
+    monkeypatch.setattr(database, "_replica_down_until", 0.0)
+    assert not await database._replica_connected(Session())
+    assert database._replica_down_until > 0
@@ -0,0 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from core import hashing
+
+
+async def test_warm_up_is_not_limited_by_queue_size(monkeypatch):
+    calls = []
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(hashing, "_executor", executor)
+    monkeypatch.setattr(hashing, "_hash", lambda password: calls.append(password))
+    monkeypatch.setattr(hashing, "HASH_WORKERS", 4)
+    monkeypatch.setattr(hashing, "HASH_QUEUE_SIZE", 2)
+    try:
+        await hashing.warm_up()
+    finally:
+        executor.shutdown()
+    assert len(calls) == 4
+    assert hashing.queue_depth() == 0
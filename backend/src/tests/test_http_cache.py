@@ -0,0 +1,65 @@
+import asyncio
+
+from starlette.requests import Request
+
+from core import lifecycle
+from core.http_cache import cached_json_response, invalidate_responses
+
+
+def make_request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+class Page:
+    def __init__(self, last: bool):
+        self.last = last
+        self.builds = 0
+
+    async def build(self):
+        self.builds += 1
+        return f'{{"build": {self.builds}}}'.encode(), self.last
+
+
+async def get(redis, name: str, page: Page, **headers):
+    response = await cached_json_response(make_request(**headers), redis, name, page.build)
+    # Дожидаемся фоновой записи в Redis
+    await asyncio.gather(*lifecycle._tasks)
+    return response
+
+
+async def test_signup_invalidates_only_the_last_page(redis):
+    first, last = Page(last=False), Page(last=True)
+    await get(redis, "users:1:None", first)
+    await get(redis, "users:1:5", last)
+
+    await invalidate_responses(redis, signup=True)
+    await get(redis, "users:1:None", first)
+    await get(redis, "users:1:5", last)
+
+    assert first.builds == 1
+    assert last.builds == 2
+
+
+async def test_update_invalidates_every_page(redis):
+    page = Page(last=False)
+    await get(redis, "users:1:None", page)
+    await invalidate_responses(redis)
+    await get(redis, "users:1:None", page)
+    assert page.builds == 2
+
+
+async def test_etag_is_the_only_validator(redis):
+    page = Page(last=False)
+    response = await get(redis, "user:1", page)
+    assert "last-modified" not in response.headers
+
+    etag = response.headers["etag"]
+    assert (await get(redis, "user:1", page, if_none_match=etag)).status_code == 304
+    # If-Modified-Since с секундной точностью не даёт 304
+    response = await get(redis, "user:1", page, if_modified_since="Fri, 01 Jan 2100 00:00:00 GMT")
+    assert response.status_code == 200
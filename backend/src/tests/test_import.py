@@ -0,0 +1,82 @@
+import io
+import json
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from core import service
+from core.service import parse_import_rows, read_import_file
+
+
+def test_csv_rows_are_parsed():
+    content = "﻿username,email\nalice,alice@example.com\n".encode()
+    assert parse_import_rows(content, "csv") == [{"username": "alice", "email": "alice@example.com"}]
+
+
+def test_invalid_json_line_becomes_none():
+    assert parse_import_rows(b'{"username": "alice"}\n\nnot json\n', "jsonl") == [{"username": "alice"}, None]
+
+
+@pytest.mark.parametrize("content, file_format", [
+    ("username\nалиса\n".encode("cp1251"), "csv"),
+    (b"\xff\xfe{}", "jsonl"),
+    # Поле длиннее csv.field_size_limit()
+    (b'username\n"' + b"a" * 200_000 + b'"\n', "csv"),
+])
+def test_unreadable_file_is_rejected(content, file_format):
+    with pytest.raises(HTTPException) as error:
+        parse_import_rows(content, file_format)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("content, file_format", [
+    (b"username\nalice\nbob\ncarol\n", "csv"),
+    (b'{}\n{}\nnot json\n', "jsonl"),
+])
+def test_too_many_rows_are_rejected(monkeypatch, content, file_format):
+    monkeypatch.setattr(service._config, "IMPORT_MAX_ROWS", 2)
+    with pytest.raises(HTTPException) as error:
+        parse_import_rows(content, file_format)
+    assert error.value.status_code == 413
+
+
+@pytest.mark.parametrize("size", [None, 11])
+async def test_too_large_file_is_rejected(monkeypatch, size):
+    monkeypatch.setattr(service._config, "IMPORT_MAX_BYTES", 10)
+    file = UploadFile(io.BytesIO(b"a" * 11), size=size)
+    with pytest.raises(HTTPException) as error:
+        await read_import_file(file)
+    assert error.value.status_code == 413
+
+
+async def test_file_within_limit_is_read(monkeypatch):
+    monkeypatch.setattr(service._config, "IMPORT_MAX_BYTES", 10)
+    assert await read_import_file(UploadFile(io.BytesIO(b"a" * 10), size=10)) == b"a" * 10
+
+
+class ImportSession:
+    async def execute(self, query, params=None):
+        raise AssertionError("No valid rows, the database must not be queried")
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.parametrize("row", [
+    {"username": "a" * 101, "email": "alice@example.com", "password": "secret"},
+    {"username": "alice", "email": "a" * 95 + "@example.com", "password": "secret"},
+])
+async def test_too_long_row_is_reported_before_hashing(monkeypatch, redis, row):
+    hashed = []
+
+    async def hash_passwords(passwords):
+        hashed.extend(passwords)
+        return []
+
+    monkeypatch.setattr(service, "hash_passwords", hash_passwords)
+    content = json.dumps(row).encode()
+    result = await service.import_users(ImportSession(), redis, content, "jsonl")
+
+    assert result.created == 0
+    assert [error.row for error in result.errors] == [1]
+    assert hashed == []
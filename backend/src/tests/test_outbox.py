@@ -0,0 +1,26 @@
+from core.models import EmailOutbox
+from core.outbox import CHANGE_PASSWORD
+from core.worker import mark_failed, mark_sent
+from settings.config import OUTBOX_MAX_ATTEMPTS
+
+
+def change_password_message(attempts: int = 0) -> EmailOutbox:
+    return EmailOutbox(kind=CHANGE_PASSWORD, payload={"code": 123456, "email": "alice@example.com"},
+                       attempts=attempts)
+
+
+def test_code_is_dropped_after_sending():
+    message = change_password_message()
+    mark_sent(message)
+    assert message.status == "sent"
+    assert message.payload == {"email": "alice@example.com"}
+
+
+def test_code_is_kept_for_retries_and_dropped_on_failure():
+    message = change_password_message(attempts=OUTBOX_MAX_ATTEMPTS - 2)
+    mark_failed(message, RuntimeError("smtp"))
+    assert message.payload["code"] == 123456
+
+    mark_failed(message, RuntimeError("smtp"))
+    assert message.status == "failed"
+    assert "code" not in message.payload
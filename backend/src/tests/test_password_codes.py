@@ -0,0 +1,18 @@
+from core.password_codes import (CODE_OK, CODE_INVALID, CODE_EXPIRED, CODE_TOO_MANY_ATTEMPTS,
+                                 create_password_code, verify_password_code)
+from settings.config import PASSWORD_CODE_MAX_ATTEMPTS
+
+
+async def test_password_code_is_single_use(redis):
+    code = await create_password_code(redis, 1, "hashed")
+    assert await verify_password_code(redis, 1, code) == (CODE_OK, "hashed")
+    assert await verify_password_code(redis, 1, code) == (CODE_EXPIRED, None)
+
+
+async def test_password_code_attempts_are_limited(redis):
+    code = await create_password_code(redis, 1, "hashed")
+    wrong = code + 1 if code < 999999 else code - 1
+    for _ in range(PASSWORD_CODE_MAX_ATTEMPTS - 1):
+        assert await verify_password_code(redis, 1, wrong) == (CODE_INVALID, None)
+    assert await verify_password_code(redis, 1, wrong) == (CODE_TOO_MANY_ATTEMPTS, None)
+    assert await verify_password_code(redis, 1, code) == (CODE_EXPIRED, None)
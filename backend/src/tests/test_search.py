@@ -0,0 +1,18 @@
+import pytest
+from fastapi import HTTPException
+
+from core.service import _parse_search_cursor
+
+
+def test_cursor_round_trip():
+    # search_users строит курсор как f"{rank!r}:{id}"
+    rank = 0.4285714328289032
+    assert _parse_search_cursor(f"{rank!r}:42") == (rank, 42)
+    assert _parse_search_cursor("2.0:7") == (2.0, 7)
+
+
+@pytest.mark.parametrize("cursor", ["", "1.0", "1.0:x", "a:1", "1.0:2:3"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        _parse_search_cursor(cursor)
+    assert error.value.status_code == 400
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from core.singleflight import SingleFlight, single_flight
+
+
+async def test_concurrent_calls_share_one_result():
+    group = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(group.do("key", load) for _ in range(5)))
+    assert results == [1] * 5
+    assert calls == 1
+
+
+async def test_error_is_raised_for_every_waiter():
+    group = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(group.do("key", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_cancelled_leader_hands_call_to_waiter():
+    group = SingleFlight()
+    started = asyncio.Event()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await asyncio.sleep(0.01)
+        return "value"
+
+    leader = asyncio.create_task(group.do("key", load))
+    await started.wait()
+    waiter = asyncio.create_task(group.do("key", load))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await waiter == "value"
+    assert calls == 2
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+async def test_cancelled_waiter_does_not_cancel_leader():
+    group = SingleFlight()
+    started = asyncio.Event()
+
+    async def load():
+        started.set()
+        await asyncio.sleep(0.01)
+        return "value"
+
+    leader = asyncio.create_task(group.do("key", load))
+    await started.wait()
+    waiter = asyncio.create_task(group.do("key", load))
+    await asyncio.sleep(0)
+    waiter.cancel()
+
+    assert await leader == "value"
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+
+async def test_none_key_bypasses_coalescing():
+    calls = 0
+
+    @single_flight(key=lambda bypass: None if bypass else "key")
+    async def load(bypass: bool):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    await asyncio.gather(load(True), load(True))
+    assert calls == 2
+    await asyncio.gather(load(False), load(False))
+    assert calls == 3
+
+
+async def test_user_flight_key_separates_binds(monkeypatch):
+    from core import service
+
+    replica, primary = object(), object()
+    monkeypatch.setattr(service, "is_replica", lambda db: db is replica)
+
+    monkeypatch.setattr(service, "replica_engine", None)
+    assert service._user_flight_key(primary, 1) == "primary:1"
+
+    # С репликой чтения с primary - read-your-writes и не объединяются с чужими
+    monkeypatch.setattr(service, "replica_engine", object())
+    assert service._user_flight_key(replica, 1) == "replica:1"
+    assert service._user_flight_key(primary, 1) is None
@@ -0,0 +1,55 @@
+import base64
+from datetime import date
+from types import SimpleNamespace
+
+from core import service
+from core.stats import ACTIVATIONS, _day_key
+
+
+class Result:
+    def __init__(self, row):
+        self.row = row
+
+    def one_or_none(self):
+        return self.row
+
+
+class UsersSession:
+    # Одна строка users; UPDATE активации выполняется как в Postgres: по неактивной строке,
+    # first_activation - прежнее activated_at было NULL
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.row = {"is_active": False, "activated_at": None}
+        self.statements = 0
+
+    async def execute(self, query):
+        self.statements += 1
+        if self.row["is_active"]:
+            return Result(None)
+        first_activation = self.row["activated_at"] is None
+        self.row["is_active"] = True
+        self.row["activated_at"] = self.row["activated_at"] or "now"
+        return Result(SimpleNamespace(id=self.user_id, first_activation=first_activation))
+
+    async def scalar(self, query):
+        return True
+
+    async def commit(self):
+        pass
+
+
+async def test_reverification_after_email_change_is_not_counted(redis):
+    db = UsersSession(1)
+    uid = base64.urlsafe_b64encode(b"1").decode()
+
+    await service.verify_email(uid, db, redis)
+    # change_username_email при смене email снова делает пользователя неактивным
+    db.row["is_active"] = False
+    await service.verify_email(uid, db, redis)
+    # Повторный переход по той же ссылке
+    await service.verify_email(uid, db, redis)
+
+    assert db.row["is_active"]
+    # Одна запись на каждое подтверждение
+    assert db.statements == 3
+    assert await redis.hget(_day_key(date.today().isoformat()), ACTIVATIONS) == "1"
@@ -0,0 +1,22 @@
+import pytest
+from fastapi import HTTPException, Request
+
+from core.throttling import RateLimiter, change_password_limiter
+
+
+async def test_rate_limiter_blocks_over_limit(redis):
+    limiter = RateLimiter("test", limit=2, window=60)
+    await limiter.hit(redis, "1.2.3.4")
+    await limiter.hit(redis, "1.2.3.4")
+    with pytest.raises(HTTPException) as error:
+        await limiter.hit(redis, "1.2.3.4")
+    assert error.value.status_code == 429
+    assert 0 < int(error.value.headers["Retry-After"]) <= 60
+    # Лимит считается отдельно для каждого ключа
+    await limiter.hit(redis, "5.6.7.8")
+
+
+def test_change_password_limiter_is_keyed_by_user():
+    request = Request({"type": "http", "client": ("1.2.3.4", 1234), "headers": []})
+    request.state.user_id = 42
+    assert change_password_limiter.key_func(request) == "42"
@@ -0,0 +1,128 @@
+import time
+
+import jwt
+import pytest
+from jwt.exceptions import InvalidTokenError
+
+from core import tokens
+from settings.config import SECRET_KEY, ALGORITHM
+
+
+def make_token(**claims) -> str:
+    return jwt.encode({"exp": int(time.time()) + 60, **claims}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+@pytest.fixture(autouse=True)
+def clear_local_caches():
+    tokens.local_tokens.clear()
+    tokens.local_versions.clear()
+
+
+@pytest.fixture
+def db_versions(monkeypatch):
+    # Вместо users.token_version; loaded - для каких пользователей читали базу
+    versions, loaded = {}, []
+
+    async def load(user_id):
+        loaded.append(user_id)
+        return versions.get(user_id, 0)
+
+    monkeypatch.setattr(tokens, "_load_token_version", load)
+    return versions, loaded
+
+
+def test_decode_returns_user_and_version():
+    assert tokens.decode_access_token(make_token(sub="7", ver=3)) == (7, 3)
+    assert tokens.decode_access_token(make_token(sub="7")) == (7, 0)
+
+
+def test_expired_token_is_rejected():
+    with pytest.raises(InvalidTokenError):
+        tokens.decode_access_token(make_token(sub="7", exp=int(time.time()) - 1))
+
+
+def test_cached_token_expires(monkeypatch):
+    token = make_token(sub="7", exp=int(time.time()) + 60)
+    tokens.decode_access_token(token)
+    monkeypatch.setattr(tokens.time, "time", lambda: time.monotonic() + 10 ** 10)
+    with pytest.raises(InvalidTokenError):
+        tokens.decode_access_token(token)
+    assert tokens.local_tokens.get(token) is None
+
+
+@pytest.mark.parametrize("claims", [{}, {"sub": "abc"}, {"sub": "7", "ver": "x"}, {"sub": None}])
+def test_malformed_claims_are_rejected(claims):
+    with pytest.raises(InvalidTokenError):
+        tokens.decode_access_token(make_token(**claims))
+
+
+def test_foreign_signature_is_rejected():
+    token = jwt.encode({"sub": "7", "exp": int(time.time()) + 60}, "other-secret-key-of-at-least-32-bytes", algorithm=ALGORITHM)
+    with pytest.raises(InvalidTokenError):
+        tokens.decode_access_token(token)
+
+
+async def test_token_below_stored_version_is_revoked(redis, db_versions):
+    await redis.hset(tokens.REVOCATION_KEY, 7, 2)
+    assert await tokens.is_token_revoked(redis, 7, 1)
+    assert not await tokens.is_token_revoked(redis, 7, 2)
+    assert db_versions[1] == []
+
+
+async def test_missing_version_is_read_from_database(redis, db_versions):
+    # Redis потерял хеш: версия берётся из users.token_version и записывается обратно
+    versions, loaded = db_versions
+    versions[7] = 2
+    assert await tokens.is_token_revoked(redis, 7, 1)
+    assert loaded == [7]
+    assert await redis.hget(tokens.REVOCATION_KEY, 7) == "2"
+
+
+async def test_backfill_does_not_overwrite_newer_revocation(redis, db_versions, monkeypatch):
+    versions, _ = db_versions
+
+    async def load_then_revoke(user_id):
+        # revoke_tokens успел записать версию между чтением базы и записью в Redis
+        await redis.hset(tokens.REVOCATION_KEY, user_id, 3)
+        return 2
+
+    monkeypatch.setattr(tokens, "_load_token_version", load_then_revoke)
+    await tokens.get_min_token_version(redis, 7)
+    assert await redis.hget(tokens.REVOCATION_KEY, 7) == "3"
+
+
+async def test_redis_error_falls_back_to_database(redis, db_versions):
+    versions, loaded = db_versions
+    versions[7] = 2
+    redis.connection_pool.connection_kwargs["server"].connected = False
+    assert await tokens.is_token_revoked(redis, 7, 1)
+    assert loaded == [7]
+
+
+async def test_revoke_tokens_updates_local_and_shared_version(redis, db_versions):
+    await tokens.revoke_tokens(redis, 7, 4)
+    assert await tokens.is_token_revoked(redis, 7, 3)
+    tokens.local_versions.clear()
+    assert await tokens.is_token_revoked(redis, 7, 3)
+    assert db_versions[1] == []
+
+
+async def test_current_user_rejects_token_older_than_row(redis):
+    from fastapi import HTTPException, Request
+    from core.cache import local_users
+    from core.dependencies import get_current_user
+    from core.schemas import CachedUserSchema
+
+    local_users.set(7, CachedUserSchema(id=7, username="alice", email="alice@example.com",
+                                        is_active=True, token_version=2))
+    request = Request({"type": "http", "headers": []})
+    try:
+        request.state.token_version = 1
+        with pytest.raises(HTTPException) as error:
+            await get_current_user(request, 7, None, redis)
+        assert error.value.status_code == 401
+
+        request.state.token_version = 2
+        assert (await get_current_user(request, 7, None, redis)).id == 7
+    finally:
+        local_users.clear()